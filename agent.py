@@ -6,22 +6,45 @@ license: gpl, see http://www.gnu.org/licenses/gpl-3.0.de.html
 description: universal easy-to-use agent classes, made for usage in minigames
 """
 
+import hashlib
+import json
+import os
 import random
+import threading
 import numpy as np
-from keras.models import Sequential, load_model
-from keras.layers import Dense, LSTM
-from sklearn.preprocessing import OneHotEncoder
+# keras (tensorflow) and sklearn are imported where they are needed,
+# so NaiveAgent, the numpy/lut backends and loaddataset start without them
+import binarydataset
+import streaming
+from inference import NumpyModel, LookupTableModel, CachedModel, file_fingerprint
 import io
 
 
 class Agent:
     """agent template"""
 
+    modelfile = None  # where train(savemodel=True) saves the model
+    epochs = 150
+    batch_size = 10
+    incremental_epochs = 5  # fine-tuning epochs of train_incremental
+    replay_ratio = 1.0  # old rows replayed per new row in train_incremental
+    cache_size = None  # rows cached in front of the model (self.cache), None: off
+    # the network: (units, activation, kernel initializer) of every Dense layer
+    layers = ()
+    loss = None
+    optimizer = "adam"
+    learning_rate = 0.001
+
     def __init__(
-        self, actions, rewards=[1, -1]
+        self, actions, rewards=[1, -1], backend="keras"
     ):  # format: actions=[int(action1),int(action2),...], rewards=[int(reward),int(penalty)]
+        # backend: "keras" predicts with the keras model, "numpy" with inference.NumpyModel,
+        # "lut" with an inference.LookupTableModel over the quantized input grid
         self.actions = actions
         self.rewards = rewards
+        self.backend = backend
+        self.model = None
+        self.cache = None  # CachedModel in front of self.model, see predict()
 
     def train(
         self, X_train, Y_train
@@ -31,6 +54,239 @@ class Agent:
     def passround(self, state):
         pass
 
+    def loadmodel(self, model):
+        # model: a keras model or the filename of a saved .h5 model, converted
+        # for self.backend; any other object with predict() (NumpyModel,
+        # trajectory.TrajectoryModel, ...) is used as it is, with any backend
+        if isinstance(model, CachedModel):
+            model = model.model
+        if self.backend == "lut" and isinstance(model, NumpyModel):
+            model = LookupTableModel(model)
+        elif isinstance(model, str):
+            if self.backend == "lut":
+                model = LookupTableModel.load(model)
+            elif self.backend == "numpy":
+                model = NumpyModel.from_h5(model)
+            else:
+                from keras.models import load_model
+
+                model = load_model(model)
+        elif is_keras_model(model):
+            if self.backend == "lut":
+                model = LookupTableModel(NumpyModel.from_keras(model))
+            elif self.backend == "numpy":
+                model = NumpyModel.from_keras(model)
+        # self.model stays the plain model (keras: save, fit, summary still work),
+        # predictions go through a new, empty cache; a lookup table is a cache already
+        if self.cache_size and not isinstance(model, LookupTableModel):
+            self.cache = CachedModel(model, self.cache_size)
+        else:
+            self.cache = None
+        # the cache is swapped first: other threads predict with the old or new model
+        self.model = model
+        #self.model.summary()
+
+    def predict(self, states):
+        # model.predict through the prediction cache, if there is one
+        cache = self.cache
+        if cache is not None:
+            return cache.predict(states)
+        return self.model.predict(states)
+
+    def create_model(self, xlength):
+        # a compiled keras model as described by layers, loss and optimizer
+        from keras import optimizers
+        from keras.models import Sequential
+        from keras.layers import Dense
+
+        model = Sequential()
+        for n, (units, activation, initializer) in enumerate(self.layers):
+            extra = {"input_dim": xlength} if n == 0 else {}
+            model.add(
+                Dense(
+                    units,
+                    activation=activation,
+                    kernel_initializer=initializer,
+                    **extra
+                )
+            )
+        optimizer = optimizers.get(
+            {
+                "class_name": self.optimizer,
+                "config": {"learning_rate": self.learning_rate},
+            }
+        )
+        model.compile(optimizer=optimizer, loss=self.loss, metrics=["accuracy"])
+        return model
+
+    def fingerprint(self, dataset, xlength):
+        # content hash of the dataset file plus architecture and hyperparameters,
+        # from the class attributes only: no keras import, no model is built
+        config = {
+            "agent": type(self).__name__,
+            "xlength": xlength,
+            "layers": self.layers,
+            "loss": self.loss,
+            "optimizer": self.optimizer,
+            "learning_rate": self.learning_rate,
+            "epochs": self.epochs,
+            "batch_size": self.batch_size,
+        }
+        config = json.dumps(config, sort_keys=True)
+        return hashlib.sha256(
+            (file_fingerprint(dataset) + config).encode("utf-8")
+        ).hexdigest()
+
+    def train_cached(self, dataset, xlength, callbacks=None):
+        # reuse self.modelfile if it was trained on the same data with the same
+        # architecture and hyperparameters, otherwise train and save it
+        # return True if the model was (re)trained
+        keyfile = os.path.splitext(self.modelfile)[0] + ".fingerprint"
+        key = self.fingerprint(dataset, xlength)
+        if os.path.exists(self.modelfile) and os.path.exists(keyfile):
+            with open(keyfile) as f:
+                if f.read().strip() == key:
+                    self.loadmodel(self.modelfile)
+                    return False
+        X, Y = loaddataset(dataset, xlength)
+        self.train(X, Y, savemodel=True, callbacks=callbacks)
+        with open(keyfile, "w") as f:
+            f.write(key + "\n")
+        return True
+
+    def train_stream(
+        self,
+        dataset,
+        xlength,
+        batch_size=1024,
+        chunk_rows=65536,
+        savemodel=False,
+        callbacks=None,
+        seed=None,
+    ):
+        # train from a dataset file (csv or .rkd) that does not need to fit in
+        # memory: shuffled chunks are read and batched in a prefetch thread
+        stream = streaming.BatchStream(
+            dataset, xlength, batch_size, chunk_rows, seed=seed
+        )
+        model = self.create_model(xlength)
+        model.fit(
+            streaming.prefetch(stream.repeat(self.epochs)),
+            steps_per_epoch=len(stream),
+            epochs=self.epochs,
+            callbacks=callbacks,
+        )
+        if savemodel:
+            model.save(self.modelfile)
+        self.loadmodel(model)
+
+    def train_incremental(self, dataset, xlength, callbacks=None, seed=None):
+        # fine-tune the saved model only on rows appended to dataset since the
+        # last call, mixed with a random replay sample of older rows, then save it
+        # a cursor file next to the model remembers how far the dataset was used
+        # return the number of new rows
+        cursorfile = os.path.splitext(self.modelfile)[0] + ".cursor"
+        cursor = None
+        if os.path.exists(cursorfile):
+            with open(cursorfile) as f:
+                cursor = json.load(f)
+            if cursor["dataset"] != os.path.abspath(dataset):
+                cursor = None
+        if not os.path.exists(self.modelfile):
+            # nothing to fine-tune yet: train on everything
+            X, Y = loaddataset(dataset, xlength)
+            self.train(X, Y, savemodel=True, callbacks=callbacks)
+            new_rows, cursor = len(X), streaming.dataset_end(dataset)
+        else:
+            if cursor is None:
+                # a saved model without cursor: it is unknown which rows it has
+                # seen, so it is fine-tuned on the whole file once
+                cursor = {"rows": 0, "offset": 0}
+            X, Y, end = streaming.read_new_rows(dataset, xlength, cursor)
+            new_rows = len(X)
+            if new_rows == 0:
+                return 0
+            rng = np.random.default_rng(seed)
+            number = int(round(new_rows * self.replay_ratio))
+            X_old, Y_old = streaming.sample_rows(dataset, xlength, cursor, number, rng)
+            X = np.concatenate((X, X_old))
+            Y = np.concatenate((Y, Y_old))
+            # a freshly compiled model with the saved weights (a new optimizer state)
+            model = self.create_model(xlength)
+            model.load_weights(self.modelfile)
+            model.fit(
+                X,
+                Y,
+                epochs=self.incremental_epochs,
+                batch_size=self.batch_size,
+                shuffle=True,
+                callbacks=callbacks,
+            )
+            model.save(self.modelfile)  # checkpoint before moving the cursor
+            self.loadmodel(model)
+            cursor = end
+        cursor["dataset"] = os.path.abspath(dataset)
+        with open(cursorfile, "w") as f:
+            json.dump(cursor, f)
+        return new_rows
+
+    def train_async(self, dataset, xlength):
+        # train_cached in a background thread, returns the running TrainingJob
+        # self.model keeps serving until the new model replaces it
+        job = TrainingJob(self, dataset, xlength)
+        job.start()
+        return job
+
+
+class TrainingJob(threading.Thread):
+    """runs agent.train_cached in a worker thread and counts finished epochs"""
+
+    def __init__(self, agent, dataset, xlength):
+        threading.Thread.__init__(self, daemon=True)
+        self.agent = agent
+        self.dataset = dataset
+        self.xlength = xlength
+        self.epoch = 0
+        self.epochs = agent.epochs
+        self.retrained = None  # False if the cached model was loaded
+        self.error = None
+
+    def run(self):
+        try:
+            self.retrained = self.agent.train_cached(
+                self.dataset, self.xlength, callbacks=[epoch_progress(self)]
+            )
+        except Exception as error:
+            self.error = error
+
+    @property
+    def done(self):
+        return not self.is_alive()
+
+    def status(self):
+        # one line for the menu
+        if self.error is not None:
+            return "training failed: {}".format(self.error)
+        if self.done:
+            return "model ready" + (" (retrained)" if self.retrained else " (cached)")
+        return "training: epoch {}/{}".format(self.epoch, self.epochs)
+
+
+def is_keras_model(model):
+    # keras (or tf.keras) model, told by its package so keras is not imported
+    return type(model).__module__.split(".")[0] in ("keras", "tensorflow", "tf_keras")
+
+
+def epoch_progress(job):
+    # keras callback that reports finished epochs to a TrainingJob
+    from keras.callbacks import Callback
+
+    class EpochProgress(Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            job.epoch = epoch + 1
+
+    return EpochProgress()
+
 
 class NaiveAgent(Agent):
     """naive agent: acts randomly"""
@@ -45,83 +301,93 @@ class NaiveAgent(Agent):
 class TrainedAgent(Agent):
     """trained agent: predicts action after training"""
 
-    def create_model(self, xlength):
-        model = Sequential()
-
-        model.add(Dense(12, input_dim=xlength, activation="relu"))
-        model.add(Dense(9, activation="relu"))
-        model.add(Dense(9, activation="relu"))
-        model.add(Dense(1, activation="sigmoid"))
-
-        model.compile(
-            optimizer="adam", loss="binary_crossentropy", metrics=["accuracy"]
-        )
-        return model
-
-    def train(self, X_train, Y_train, savemodel=False):
+    modelfile = "model.h5"
+    cache_size = 4096
+    layers = (
+        (12, "relu", "glorot_uniform"),
+        (9, "relu", "glorot_uniform"),
+        (9, "relu", "glorot_uniform"),
+        (1, "sigmoid", "glorot_uniform"),
+    )
+    loss = "binary_crossentropy"
+
+    def train(self, X_train, Y_train, savemodel=False, callbacks=None):
         # train agent with X and Y from dataset
         xlength = len(X_train[0])
 
-        self.model = self.create_model(xlength)
-        self.model.fit(X_train, Y_train, epochs=150, batch_size=10)
-        self.model.summary()
+        model = self.create_model(xlength)
+        model.fit(
+            X_train,
+            Y_train,
+            epochs=self.epochs,
+            batch_size=self.batch_size,
+            callbacks=callbacks,
+        )
+        model.summary()
         if savemodel:
-            self.model.save("model.h5")
-        _, accuracy = self.model.evaluate(X_train, Y_train)
+            model.save(self.modelfile)
+        _, accuracy = model.evaluate(X_train, Y_train)
         print("Accuracy: %.2f" % (accuracy * 100))
-
-    def loadmodel(self, model):
-        self.model = model
-        #self.model.summary()
+        self.loadmodel(model)
 
     def passround(self, state):
         # predict Y | X = state
         # return Y
-        predictions = self.model.predict(state)
+        predictions = self.predict(state)
         preds = []
         for line in predictions:
             preds.append(np.where(line == max(line))[0][0])
         return preds
 
-class EvolvedAgent(Agent):
-    """trained agent: predicts action after training"""
-
-    def create_model(self, xlength):
-        model = Sequential()
+    def classify(self, states):
+        # score a whole batch of states with one model call
+        # return array of 0/1 labels (sigmoid output rounded)
+        states = np.asarray(states, dtype=np.float32)
+        if states.size == 0:  # [] or an empty (0, n) batch: no candidates
+            return np.zeros(0, dtype=int)
+        predictions = self.predict(np.atleast_2d(states))
+        return np.round(predictions[:, 0]).astype(int)
 
-        model.add(Dense(8, input_dim=xlength, activation = "relu", kernel_initializer="he_uniform"))
-        model.add(Dense(16, activation="relu", kernel_initializer='he_uniform'))
-        model.add(Dense(32, activation="relu", kernel_initializer='he_uniform'))
-        model.add(Dense(16, activation="relu", kernel_initializer='he_uniform'))
-        model.add(Dense(32, activation="relu", kernel_initializer='he_uniform'))
-        model.add(Dense(8, activation="relu", kernel_initializer='he_uniform'))
-        model.add(Dense(1, activation="linear"))
 
-        model.compile(
-            optimizer="adam", loss="mean_absolute_error", metrics=["accuracy"]
-        )
-        return model
+class EvolvedAgent(Agent):
+    """trained agent: predicts action after training"""
 
-    def train(self, X_train, Y_train, savemodel=False):
+    modelfile = "movingmodel.h5"
+    cache_size = 4096
+    layers = (
+        (8, "relu", "he_uniform"),
+        (16, "relu", "he_uniform"),
+        (32, "relu", "he_uniform"),
+        (16, "relu", "he_uniform"),
+        (32, "relu", "he_uniform"),
+        (8, "relu", "he_uniform"),
+        (1, "linear", "glorot_uniform"),
+    )
+    loss = "mean_absolute_error"
+
+    def train(self, X_train, Y_train, savemodel=False, callbacks=None):
         # train agent with X and Y from dataset
         xlength = len(X_train[0])
 
-        self.model = self.create_model(xlength)
-        self.model.fit(X_train, Y_train, epochs=150, batch_size=10)
-        self.model.summary()
+        model = self.create_model(xlength)
+        model.fit(
+            X_train,
+            Y_train,
+            epochs=self.epochs,
+            batch_size=self.batch_size,
+            callbacks=callbacks,
+        )
+        model.summary()
         if savemodel:
-            self.model.save("movingmodel.h5")
-        _, accuracy = self.model.evaluate(X_train, Y_train)
+            model.save(self.modelfile)
+        _, accuracy = model.evaluate(X_train, Y_train)
         print("Accuracy: %.2f" % (accuracy * 100))
-
-    def loadmodel(self, model):
-        self.model = model
-        #self.model.summary()
+        self.loadmodel(model)
 
     def passround(self, state):
         # predict Y | X = state
         # return Y
-        predictions = self.model.predict(state)
+        predictions = self.predict(state)
         preds = []
         for line in predictions:
             preds.append(np.where(line == max(line))[0][0])
@@ -129,6 +395,8 @@ class EvolvedAgent(Agent):
 
 
 def one_hot(encode):
+    from sklearn.preprocessing import OneHotEncoder
+
     o = OneHotEncoder(sparse=False)
     return o.fit_transform(encode)
 
@@ -139,6 +407,9 @@ def convertstr_to_state(unmodded_string):
 
 
 def loaddataset(dataset, xlength):
+    # dataset: a csv text file or a binary .rkd file (see binarydataset.py)
+    if binarydataset.is_binary(dataset):
+        return binarydataset.load_xy(dataset, xlength)
     loadedtxt = np.loadtxt(dataset, delimiter=",")
     X = loadedtxt[:, 0:xlength]
     Y = loadedtxt[:, xlength]
@@ -162,8 +433,7 @@ if __name__ == "__main__":
     # trained_agent.train(X, Y, savemodel=True)
 
     # ----- loading a saved model -> MUCH MUCH QUICKER
-    model = load_model("model.h5")
-    trained_agent.loadmodel(model)
+    trained_agent.loadmodel("model.h5")
     action = trained_agent.passround(convertstr_to_state("0,1,1,0,0,1,1,1,1"))
     print(action)
 
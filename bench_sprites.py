@@ -0,0 +1,111 @@
+"""
+particle construction benchmark
+
+creates many sparks, once as the old VectorSprite based spark and once as the
+lean Particle based Spark of rocketViewer, and reports for each the construction
+time and the memory kept alive per particle, and how long a full garbage
+collection takes while they are alive.
+
+usage:
+    python bench_sprites.py --particles 20000 --repeat 3
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import argparse
+import gc
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import rocketViewer
+from rocketViewer import Spark, VectorSprite, randomize_colors
+
+
+class LegacySpark(VectorSprite):
+    """the spark as it was before Particle: a VectorSprite with its own image"""
+
+    def _overwrite_parameters(self):
+        self._layer = 9
+        self.kill_on_edge = True
+        self.color = randomize_colors(self.color, 50)
+
+    def create_image(self):
+        self.image = pygame.Surface((10, 10))
+        pygame.draw.line(self.image, self.color, (10, 5), (5, 5), 3)
+        pygame.draw.line(self.image, self.color, (5, 5), (2, 5), 1)
+        self.image.set_colorkey((0, 0, 0))
+        self.rect = self.image.get_rect()
+        self.image0 = self.image.copy()
+
+
+def make(cls, number):
+    """number sparks of cls, created like Explosion does"""
+    rng = random.Random(1)
+    for _ in range(number):
+        a = rng.triangular(0, 360)
+        cls(
+            pos=pygame.math.Vector2(600, 400),
+            move=pygame.math.Vector2(1, 0).rotate(a) * rng.randint(20, 150),
+            angle=a,
+            max_age=rng.random() * 2.5,
+            color=(255, 255, 0),
+        )
+
+
+def measure(cls, number, repeat=3):
+    """best construction time per particle (s), memory per particle (bytes)
+    and the duration of gc.collect() (s) with number particles alive"""
+    group = pygame.sprite.LayeredUpdates()
+    cls.groups = group
+    best = None
+    for _ in range(repeat):
+        group.empty()
+        gc.collect()
+        start = time.perf_counter()
+        make(cls, number)
+        duration = (time.perf_counter() - start) / number
+        best = duration if best is None else min(best, duration)
+    group.empty()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    make(cls, number)
+    memory = (tracemalloc.get_traced_memory()[0] - before) / number
+    tracemalloc.stop()
+    start = time.perf_counter()
+    gc.collect()
+    collect = time.perf_counter() - start
+    group.empty()
+    return best, memory, collect
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="particle construction benchmark")
+    parser.add_argument("--particles", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    pygame.display.set_mode((rocketViewer.Viewer.width or 1200, 800))
+    rocketViewer.Viewer.screenrect = pygame.Rect(0, 0, 1200, 800)
+    print("{} particles, best of {}".format(args.particles, args.repeat))
+    for cls in (LegacySpark, Spark):
+        duration, memory, collect = measure(cls, args.particles, args.repeat)
+        print(
+            "{:12} {:7.2f} us/particle  {:7.0f} bytes/particle  gc {:6.2f} ms".format(
+                cls.__name__, duration * 1e6, memory, collect * 1000
+            )
+        )
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+cold-start import benchmark
+
+imports each module in a fresh python process, takes the best of a few runs and
+checks it against a time budget. also fails if importing the module pulls in
+tensorflow, keras or sklearn.
+
+usage:
+    python bench_startup.py --budget 1.0 --repeat 5
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = ["agent", "inference", "simulation", "datagen", "rocketViewer"]
+HEAVY = ["tensorflow", "keras", "sklearn"]
+
+# runs in the child process: time the import and list heavy modules it loaded
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(duration, ",".join(heavy))
+"""
+
+
+def measure(module, repeat=5):
+    """best import time in seconds of module over repeat cold starts,
+    and the heavy modules it imported"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    best, heavy = None, []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=here,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        duration = float(output[0])
+        heavy = output[1].split(",") if len(output) > 1 else []
+        best = duration if best is None else min(best, duration)
+    return best, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="cold-start import time benchmark")
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="seconds allowed per module import"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts per module")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        duration, heavy = measure(module, args.repeat)
+        ok = duration <= args.budget and not heavy
+        failed |= not ok
+        print(
+            "{:15} {:7.3f} s  {}{}".format(
+                module,
+                duration,
+                "ok" if ok else "OVER BUDGET" if duration > args.budget else "FAILED",
+                "  (imports {})".format(", ".join(heavy)) if heavy else "",
+            )
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
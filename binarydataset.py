@@ -0,0 +1,159 @@
+"""
+binary dataset format (.rkd) with memory-mapped loading
+
+a .rkd file is a small header followed by fixed-size records:
+
+    b"RKDS"  uint8 version  3 bytes padding  uint32 header length
+    json header {"columns": [[name, numpy dtype], ...]}, padded to 64 bytes
+    records, one per row, the typed columns packed one after another
+
+the number of rows follows from the file size, so appending is just writing
+records at the end of the file. open_dataset() maps the records into memory
+without copying; every column is a zero-copy view (data["factor1"]).
+
+usage:
+    python binarydataset.py dataset.txt dataset.rkd --schema static
+    python binarydataset.py movingdataset.txt movingdataset.rkd --schema moving
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import argparse
+import itertools
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"RKDS"
+VERSION = 1
+ALIGN = 64
+PREFIX = struct.Struct("<4sB3xI")  # magic, version, header length
+
+# column layouts of dataset.txt and movingdataset.txt
+STATIC = [
+    ("factor1", "<f4"),
+    ("factor2", "<f4"),
+    ("factor3", "i1"),
+    ("factor4", "i1"),
+    ("winner", "u1"),
+]
+MOVING = [
+    ("target_speed", "<i2"),
+    ("rocket_speed", "<i2"),
+    ("target_y", "<i2"),
+    ("direction", "i1"),
+    ("hit_y", "<i2"),
+]
+SCHEMAS = {"static": STATIC, "moving": MOVING}
+
+
+def is_binary(filename):
+    """True if filename is a .rkd file"""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filename):
+    """returns (record dtype, offset of the first record)"""
+    with open(filename, "rb") as f:
+        magic, version, length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a .rkd dataset".format(filename))
+        if version != VERSION:
+            raise ValueError("{}: unknown .rkd version {}".format(filename, version))
+        header = json.loads(f.read(length).decode("utf-8"))
+    columns = [tuple(column) for column in header["columns"]]
+    return np.dtype(columns), PREFIX.size + length
+
+
+def create(filename, columns):
+    """write an empty dataset with the given [(name, dtype), ...] columns"""
+    header = json.dumps({"columns": columns}).encode("utf-8")
+    length = -(-(PREFIX.size + len(header)) // ALIGN) * ALIGN - PREFIX.size
+    with open(filename, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, length))
+        f.write(header.ljust(length, b" "))
+
+
+def open_dataset(filename, mode="r"):
+    """memory-map all records of filename as a numpy structured array"""
+    dtype, offset = read_header(filename)
+    rows = (os.path.getsize(filename) - offset) // dtype.itemsize
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode=mode, offset=offset, shape=(rows,))
+
+
+def to_records(rows, dtype):
+    """turn a 2d array (or list of rows) of numbers into records of dtype"""
+    if isinstance(rows, np.ndarray) and rows.dtype == dtype:
+        return rows
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(dtype.names))
+    records = np.empty(len(rows), dtype=dtype)
+    for n, name in enumerate(dtype.names):
+        records[name] = rows[:, n]
+    return records
+
+
+def append(filename, rows, columns=None):
+    """append rows to filename, creating it with columns if it does not exist.
+    returns the number of rows written"""
+    if not os.path.exists(filename):
+        if columns is None:
+            raise ValueError("{} does not exist and no columns given".format(filename))
+        create(filename, columns)
+    dtype, offset = read_header(filename)
+    records = to_records(rows, dtype)
+    with open(filename, "r+b") as f:
+        # cut off a partly written record (e.g. after a crash) before appending
+        rows_before = (os.path.getsize(filename) - offset) // dtype.itemsize
+        f.truncate(offset + rows_before * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(records.tobytes())
+    return len(records)
+
+
+def convert(csvfile, filename, columns, chunk_rows=100000):
+    """append the rows of a dataset.txt style csv file to filename, chunk by chunk.
+    returns the number of rows converted"""
+    converted = 0
+    with open(csvfile) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+            rows = np.loadtxt(lines, delimiter=",", ndmin=2)
+            converted += append(filename, rows, columns)
+    return converted
+
+
+def records_xy(data, xlength):
+    """X (first xlength fields, float32) and Y (next field) of an array of records"""
+    names = data.dtype.names
+    X = np.empty((len(data), xlength), dtype=np.float32)
+    for n, name in enumerate(names[:xlength]):
+        X[:, n] = data[name]
+    Y = np.asarray(data[names[xlength]], dtype=np.float32)
+    return X, Y
+
+
+def load_xy(filename, xlength):
+    """X (first xlength columns, float32) and Y (next column) like agent.loaddataset"""
+    return records_xy(open_dataset(filename), xlength)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="convert a csv dataset to .rkd")
+    parser.add_argument("csvfile", help="e.g. dataset.txt")
+    parser.add_argument("filename", help="e.g. dataset.rkd (rows are appended)")
+    parser.add_argument("--schema", choices=sorted(SCHEMAS), default="static")
+    args = parser.parse_args(argv)
+    rows = convert(args.csvfile, args.filename, SCHEMAS[args.schema])
+    print("{} rows appended to {}".format(rows, args.filename))
+
+
+if __name__ == "__main__":
+    main()
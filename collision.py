@@ -0,0 +1,138 @@
+"""
+collision detection with a spatial hash broad phase
+
+the broad phase sorts sprites into a uniform grid (SpatialHash), so a sprite is
+only tested against the sprites in the cells its rect touches. the narrow phase
+(pixel masks) runs only for candidate pairs whose rects overlap. masks are cached
+per image: sprites sharing pre-rotated images (see RotationCache in
+rocketViewer) share one mask per rotation bucket, and a sprite whose image does
+not change gets its mask only once.
+
+collide_arrays() does the same for array based rocket state (simulation.py):
+centers and half extents of many rockets against a few boxes, in one call.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import weakref
+import numpy as np
+import pygame
+
+CELL_SIZE = 64  # pixels, about the size of the biggest sprite
+
+masks = weakref.WeakKeyDictionary()  # { image surface: pygame.mask.Mask }
+
+
+def mask_of(image):
+    """the mask of image, created on first use"""
+    mask = masks.get(image)
+    if mask is None:
+        mask = masks[image] = pygame.mask.from_surface(image)
+    return mask
+
+
+def collide_mask(a, b):
+    """like pygame.sprite.collide_mask, but with cached masks"""
+    offset = (b.rect.left - a.rect.left, b.rect.top - a.rect.top)
+    return mask_of(a.image).overlap(mask_of(b.image), offset) is not None
+
+
+class SpatialHash:
+    """uniform grid of cell_size pixels, every cell lists the items whose rect
+    touches it"""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # { (column, row): [item, ...] }
+
+    def __len__(self):
+        return len(self.cells)
+
+    def clear(self):
+        self.cells.clear()
+
+    def cells_of(self, rect):
+        """all (column, row) cells touched by rect"""
+        size = self.cell_size
+        for column in range(rect.left // size, (rect.right - 1) // size + 1):
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield column, row
+
+    def insert(self, item, rect):
+        for cell in self.cells_of(rect):
+            self.cells.setdefault(cell, []).append(item)
+
+    def query(self, rect):
+        """items in the cells touched by rect, each only once"""
+        found = {}
+        cells = self.cells
+        for cell in self.cells_of(rect):
+            for item in cells.get(cell, ()):
+                found[item] = None
+        return list(found)
+
+
+def collide_groups(sprites, others, collided=collide_mask, cell_size=CELL_SIZE):
+    """{ sprite: [other, ...] } for every sprite hitting one of others, like
+    pygame.sprite.spritecollide for each sprite. others are hashed once and
+    collided only runs for pairs with overlapping rects"""
+    grid = SpatialHash(cell_size)
+    for other in others:
+        grid.insert(other, other.rect)
+    hits = {}
+    for sprite in sprites:
+        rect = sprite.rect
+        found = [
+            other
+            for other in grid.query(rect)
+            if other is not sprite
+            and rect.colliderect(other.rect)
+            and (collided is None or collided(sprite, other))
+        ]
+        if found:
+            hits[sprite] = found
+    return hits
+
+
+def collide_arrays(x, y, half_w, half_h, boxes, cell_size=CELL_SIZE):
+    """batched collision of many rockets with a few boxes.
+    x, y: rocket centers (e.g. RocketSwarm.x, .y), half_w, half_h: half extents
+    of the rockets (arrays or numbers), boxes: (n, 4) centerx, centery, half
+    width, half height. returns the index arrays (rockets, boxes) of all
+    overlapping pairs"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    half_w = np.broadcast_to(np.asarray(half_w, dtype=np.float64), x.shape)
+    half_h = np.broadcast_to(np.asarray(half_h, dtype=np.float64), x.shape)
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(x) == 0 or len(boxes) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    # ---- broad phase: rockets sorted by the cell of their center ----
+    column = np.floor(x / cell_size).astype(np.int64)
+    row = np.floor(y / cell_size).astype(np.int64)
+    key = (column << 32) + row  # sorts by column, then row
+    order = np.argsort(key, kind="stable")
+    keys = key[order]
+    reach_w, reach_h = half_w.max(), half_h.max()
+    rockets, hit_boxes = [], []
+    for n, (bx, by, bw, bh) in enumerate(boxes):
+        first_row = int(np.floor((by - bh - reach_h) / cell_size))
+        last_row = int(np.floor((by + bh + reach_h) / cell_size))
+        first_column = int(np.floor((bx - bw - reach_w) / cell_size))
+        last_column = int(np.floor((bx + bw + reach_w) / cell_size))
+        candidates = []
+        for c in range(first_column, last_column + 1):
+            # the cells of one column are next to each other in keys
+            start = np.searchsorted(keys, (c << 32) + first_row, "left")
+            end = np.searchsorted(keys, (c << 32) + last_row, "right")
+            candidates.append(order[start:end])
+        candidates = np.concatenate(candidates)
+        # ---- narrow phase: bounding boxes of the candidates ----
+        hit = (np.abs(x[candidates] - bx) < half_w[candidates] + bw) & (
+            np.abs(y[candidates] - by) < half_h[candidates] + bh
+        )
+        rockets.append(candidates[hit])
+        hit_boxes.append(np.full(np.count_nonzero(hit), n, dtype=np.intp))
+    return np.concatenate(rockets), np.concatenate(hit_boxes)
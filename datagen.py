@@ -0,0 +1,169 @@
+"""
+parallel dataset generator
+
+spreads headless rocket simulations (see simulation.py) over a process pool.
+every task gets its own seeded random stream and writes one shard file,
+a final merge appends all shards in task order to dataset.txt / movingdataset.txt
+with exactly the columns agent.loaddataset expects (or, for an output file
+ending in .rkd, to a binary dataset, see binarydataset.py).
+
+usage:
+    python datagen.py static --rockets 1000000 --workers 32 --seed 1
+    python datagen.py moving --rockets 1000000 --output movingdataset.txt
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+import numpy as np
+import binarydataset
+import simulation
+
+# column layout of the two dataset files, see SmartRocket.kill / SmarterRocket.kill
+FORMATS = {
+    "static": "%.1f,%.1f,%d,%d,%d",  # factor1, factor2, factor3, factor4, winner
+    "moving": "%d,%d,%d,%d,%d",  # target speed, rocket speed, target y, direction, hit y
+}
+OUTPUTS = {"static": "dataset.txt", "moving": "movingdataset.txt"}
+
+
+def run_task(task):
+    """worker: simulate one chunk of rockets and write it to its shard file"""
+    kind, number, seed, shard, seconds = task
+    rng = np.random.default_rng(seed)
+    if kind == "static":
+        factors, winners = simulation.label_swarm(number, seconds, rng)
+        rows = np.column_stack((factors, winners))
+    else:
+        rows = simulation.label_shots(number, seconds, rng)
+    np.savetxt(shard, rows, fmt=FORMATS[kind])
+    return shard, len(rows)
+
+
+def make_tasks(kind, rockets, chunksize, seed, shard_dir, seconds):
+    """split rockets into chunks, each with its own child of one SeedSequence.
+    the streams only depend on seed and chunksize, not on the number of workers"""
+    number_of_tasks = -(-rockets // chunksize)  # ceil
+    seeds = np.random.SeedSequence(seed).spawn(number_of_tasks)
+    tasks = []
+    for n, child in enumerate(seeds):
+        number = min(chunksize, rockets - n * chunksize)
+        shard = os.path.join(shard_dir, "{}-{:05d}.txt".format(kind, n))
+        tasks.append((kind, number, child, shard, seconds))
+    return tasks
+
+
+def merge_shards(shards, output, append=True):
+    """concatenate shard files (in the given order) into output"""
+    with open(output, "a" if append else "w") as target:
+        for shard in shards:
+            with open(shard) as source:
+                shutil.copyfileobj(source, target)
+
+
+def generate(
+    kind,
+    rockets,
+    workers=None,
+    seed=None,
+    output=None,
+    shard_dir="shards",
+    chunksize=10000,
+    seconds=1 / simulation.FPS,
+    append=True,
+    keep_shards=False,
+):
+    """simulate rockets in a process pool and merge the shards into output.
+    returns the number of rows written"""
+    output = output or OUTPUTS[kind]
+    os.makedirs(shard_dir, exist_ok=True)
+    tasks = make_tasks(kind, rockets, chunksize, seed, shard_dir, seconds)
+    rows = 0
+    with multiprocessing.Pool(workers) as pool:
+        for n, (shard, number) in enumerate(pool.imap_unordered(run_task, tasks)):
+            rows += number
+            print(
+                "shard {}/{} done: {} ({} rows)".format(
+                    n + 1, len(tasks), shard, number
+                )
+            )
+    shards = [task[3] for task in tasks]
+    if output.endswith(".rkd"):
+        if not append and os.path.exists(output):
+            os.remove(output)
+        for shard in shards:
+            binarydataset.convert(shard, output, binarydataset.SCHEMAS[kind])
+    else:
+        merge_shards(shards, output, append)
+    if not keep_shards:
+        for shard in shards:
+            os.remove(shard)
+        if not os.listdir(shard_dir):
+            os.rmdir(shard_dir)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate rocket datasets in parallel")
+    parser.add_argument(
+        "kind",
+        choices=sorted(FORMATS),
+        help="static: dataset.txt, moving: movingdataset.txt",
+    )
+    parser.add_argument(
+        "--rockets", type=int, default=100000, help="number of rockets to simulate"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes (default: all cores)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="root seed for reproducible runs"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="dataset file, .rkd for binary (default: dataset.txt / movingdataset.txt)",
+    )
+    parser.add_argument(
+        "--shard-dir", default="shards", help="directory for the worker shard files"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=10000, help="rockets per shard"
+    )
+    parser.add_argument(
+        "--fps", type=float, default=simulation.FPS, help="simulation steps per second"
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="replace output instead of appending"
+    )
+    parser.add_argument(
+        "--keep-shards",
+        action="store_true",
+        help="do not delete shard files after merging",
+    )
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = generate(
+        args.kind,
+        args.rockets,
+        workers=args.workers,
+        seed=args.seed,
+        output=args.output,
+        shard_dir=args.shard_dir,
+        chunksize=args.chunksize,
+        seconds=1 / args.fps,
+        append=not args.overwrite,
+        keep_shards=args.keep_shards,
+    )
+    print("{} rows written in {:.1f} s".format(rows, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
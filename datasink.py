@@ -0,0 +1,105 @@
+"""
+buffered dataset writer
+
+rockets hand their finished dataset rows to a shared DatasetSink instead of
+opening dataset.txt / movingdataset.txt for every single row. the sink keeps
+the rows in memory and a background thread appends them in bulk when enough
+rows are waiting or enough time has passed. everything left is flushed at exit.
+a filename ending in .rkd is appended to as a binary dataset (binarydataset.py).
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import atexit
+import threading
+import binarydataset
+
+
+class DatasetSink:
+    """collects rows (strings ending with newline) for one dataset file"""
+
+    sinks = {}  # { filename: DatasetSink }, one shared sink per file
+    lock = threading.Lock()  # protects sinks
+
+    def __init__(self, filename, columns=None, max_rows=1000, max_seconds=1.0):
+        self.filename = filename
+        self.columns = columns  # binarydataset columns, to create a new .rkd file
+        self.max_rows = max_rows  # flush when this many rows are waiting...
+        self.max_seconds = max_seconds  # ...or at least every max_seconds
+        self.rows = []
+        self.rows_lock = threading.Lock()
+        self.write_lock = threading.Lock()  # only one flush writes at a time
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.written = 0  # rows written to the file so far
+
+    @classmethod
+    def get(cls, filename, columns=None, **kwargs):
+        """the shared sink for filename, created on first use"""
+        with cls.lock:
+            if filename not in cls.sinks:
+                cls.sinks[filename] = cls(filename, columns, **kwargs)
+            return cls.sinks[filename]
+
+    @classmethod
+    def close_all(cls):
+        with cls.lock:
+            sinks = list(cls.sinks.values())
+        for sink in sinks:
+            sink.close()
+
+    def write(self, row):
+        """queue one row, never blocks on file io"""
+        with self.rows_lock:
+            self.rows.append(row)
+            waiting = len(self.rows)
+        if not self.running:
+            self.start()
+        if waiting >= self.max_rows:
+            self.wakeup.set()
+
+    def start(self):
+        with self.rows_lock:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            self.wakeup.wait(self.max_seconds)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """append all waiting rows to the file in one write"""
+        with self.write_lock:
+            with self.rows_lock:
+                rows, self.rows = self.rows, []
+            if not rows:
+                return
+            if self.filename.endswith(".rkd"):
+                binarydataset.append(
+                    self.filename,
+                    [row.strip().split(",") for row in rows],
+                    self.columns,
+                )
+            else:
+                with open(self.filename, "a") as dataset:
+                    dataset.write("".join(rows))
+            self.written += len(rows)
+
+    def close(self):
+        """stop the background thread and write what is left"""
+        if self.running:
+            self.running = False
+            self.wakeup.set()
+            self.thread.join()
+        self.flush()
+
+
+atexit.register(DatasetSink.close_all)
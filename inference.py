@@ -0,0 +1,339 @@
+"""
+lightweight inference for the small Dense models in agent.py
+
+reads the weights of a Keras Sequential model (from model.h5 / movingmodel.h5 or a
+loaded model) once and runs the forward pass as plain numpy matmuls.
+a NumpyModel has the same predict() as a Keras model, so agents and the viewer
+can use it wherever they call model.predict.
+a LookupTableModel goes one step further for the quantized input space of
+TrainedAgent: the model is evaluated once over the whole grid and predictions
+become an index lookup.
+an AsyncPredictor runs any model's predict in a worker thread, so a frame never
+waits for inference, and a CachedModel remembers the predictions of recent inputs.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def linear(x):
+    return x
+
+
+ACTIVATIONS = {"relu": relu, "sigmoid": sigmoid, "linear": linear}
+
+
+class NumpyModel:
+    """a stack of Dense layers: list of (kernel, bias, activation name)"""
+
+    def __init__(self, layers):
+        self.layers = [
+            (
+                np.asarray(kernel, dtype=np.float32),
+                np.asarray(bias, dtype=np.float32),
+                ACTIVATIONS[activation],
+            )
+            for kernel, bias, activation in layers
+        ]
+        self.input_dim = self.layers[0][0].shape[0]
+
+    @classmethod
+    def from_keras(cls, model):
+        """copy the weights out of a (trained or loaded) Keras model"""
+        layers = []
+        for layer in model.layers:
+            kernel, bias = layer.get_weights()
+            layers.append((kernel, bias, layer.get_config()["activation"]))
+        return cls(layers)
+
+    @classmethod
+    def from_h5(cls, filename):
+        """read weights and activations from a Keras .h5 file without Keras"""
+        import h5py  # only needed here, comes with keras
+
+        with h5py.File(filename, "r") as f:
+            config = f.attrs["model_config"]
+            if isinstance(config, bytes):
+                config = config.decode("utf-8")
+            config = json.loads(config)["config"]
+            if isinstance(config, dict):  # newer keras: {"name": ..., "layers": [...]}
+                config = config["layers"]
+            layers = []
+            for layer in config:
+                if layer["class_name"] != "Dense":
+                    continue  # e.g. InputLayer
+                name = layer["config"]["name"]
+                weights = {}
+
+                def collect(path, item):
+                    if isinstance(item, h5py.Dataset):
+                        weights.setdefault(path.split("/")[-1], item[()])
+
+                f["model_weights"][name].visititems(collect)
+                kernel = next(v for k, v in weights.items() if k.startswith("kernel"))
+                bias = next(v for k, v in weights.items() if k.startswith("bias"))
+                layers.append((kernel, bias, layer["config"]["activation"]))
+        return cls(layers)
+
+    def predict(self, x, **kwargs):
+        """forward pass, returns an array of shape (rows, units) like Keras.
+        a single row takes a cheaper vector path"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1 or len(x) == 1:
+            return self.predict_one(x.reshape(-1))
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def predict_one(self, row):
+        """forward pass for one state vector, returns shape (1, units)"""
+        x = np.asarray(row, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x.reshape(1, -1)
+
+    def summary(self):
+        for n, (kernel, bias, activation) in enumerate(self.layers):
+            print(
+                "dense {}: {} -> {} {}".format(
+                    n, kernel.shape[0], kernel.shape[1], activation.__name__
+                )
+            )
+
+
+# quantized input space of TrainedAgent (see dataset.txt): (start, stop, step) per feature
+STATIC_GRID = ((0.1, 5.6, 0.1), (5.0, 65.0, 0.1), (-1, 1, 2), (-1, 1, 2))
+
+
+def file_fingerprint(filename):
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LookupTableModel:
+    """a model evaluated once over a finite grid of inputs.
+
+    the predictions are stored as uint8 probability (0..255) per grid point,
+    predict() becomes an index lookup. inputs are snapped to the nearest grid point
+    (clipped at the borders).
+    """
+
+    def __init__(self, model=None, axes=STATIC_GRID, table=None):
+        self.axes = axes
+        self.starts = np.array([a[0] for a in axes], dtype=np.float64)
+        self.steps = np.array([a[2] for a in axes], dtype=np.float64)
+        self.sizes = np.array(
+            [int(round((a[1] - a[0]) / a[2])) + 1 for a in axes], dtype=np.int64
+        )
+        self.strides = np.cumprod(np.append(self.sizes[1:], 1)[::-1])[::-1]
+        if table is None:
+            table = self.build(model)
+        self.table = table
+
+    def grid(self):
+        """all grid points as a (points, features) array, in table order"""
+        values = [
+            s + np.arange(n) * d for s, d, n in zip(self.starts, self.steps, self.sizes)
+        ]
+        mesh = np.meshgrid(*values, indexing="ij")
+        return np.stack([m.reshape(-1) for m in mesh], axis=1).astype(np.float32)
+
+    def build(self, model):
+        """evaluate model over the whole grid, returns the uint8 table"""
+        probabilities = model.predict(self.grid())[:, 0]
+        return np.round(np.clip(probabilities, 0, 1) * 255).astype(np.uint8)
+
+    @classmethod
+    def load(cls, filename, axes=STATIC_GRID):
+        """table for the .h5 model in filename, cached next to it as .lut.npz.
+        the cache is rebuilt when the model file's fingerprint changes"""
+        cachename = os.path.splitext(filename)[0] + ".lut.npz"
+        fingerprint = file_fingerprint(filename)
+        if os.path.exists(cachename):
+            with np.load(cachename) as cache:
+                if str(cache["fingerprint"]) == fingerprint and np.array_equal(
+                    cache["axes"], np.array(axes, dtype=np.float64)
+                ):
+                    return cls(axes=axes, table=cache["table"])
+        lut = cls(NumpyModel.from_h5(filename), axes)
+        np.savez(
+            cachename,
+            table=lut.table,
+            fingerprint=fingerprint,
+            axes=np.array(axes, dtype=np.float64),
+        )
+        return lut
+
+    def index(self, x):
+        """flat table index of each row of x"""
+        cells = np.rint((np.atleast_2d(x) - self.starts) / self.steps).astype(np.int64)
+        np.clip(cells, 0, self.sizes - 1, out=cells)
+        return cells @ self.strides
+
+    def predict(self, x, **kwargs):
+        """like Keras predict: probabilities of shape (rows, 1)"""
+        return (self.table[self.index(x)] / np.float32(255)).reshape(-1, 1)
+
+
+class AsyncPredictor:
+    """runs model.predict in a background thread, so the caller never waits.
+    submit() only replaces the waiting request: requests that pile up while the
+    worker is busy are coalesced and only the newest state is predicted.
+    result() returns the newest finished prediction, or None if the state it
+    was made for is older than max_staleness seconds"""
+
+    def __init__(self, max_staleness=0.25):
+        self.max_staleness = max_staleness
+        self.condition = threading.Condition()
+        self.pending = None  # (model, x, time of submit), newest request only
+        self.latest = None  # (prediction, time of submit of its request)
+        self.error = None  # last exception raised by model.predict
+        self.running = False
+        self.thread = None
+        self.submitted = 0  # statistics
+        self.coalesced = 0  # requests replaced before the worker took them
+        self.completed = 0
+
+    def submit(self, model, x):
+        """queue x for model.predict, never blocks"""
+        with self.condition:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = (model, x, time.perf_counter())
+            self.submitted += 1
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        # close() hands the worker over to the next submit(), so a worker runs
+        # only as long as it is self.thread
+        worker = threading.current_thread()
+        while True:
+            with self.condition:
+                while self.pending is None and self.thread is worker:
+                    self.condition.wait()
+                if self.thread is not worker:
+                    return
+                model, x, submitted = self.pending
+                self.pending = None
+            try:
+                prediction = model.predict(x)
+            except Exception as error:  # keep the worker alive, report the error
+                self.error = error
+                continue
+            self.error = None
+            with self.condition:
+                # a slow request must not overwrite a newer result
+                if self.latest is None or submitted >= self.latest[1]:
+                    self.latest = (prediction, submitted)
+                self.completed += 1
+
+    def result(self, max_staleness=None):
+        """newest finished prediction, None if there is none fresh enough"""
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        latest = self.latest
+        if latest is None:
+            return None
+        prediction, submitted = latest
+        if (
+            max_staleness is not None
+            and time.perf_counter() - submitted > max_staleness
+        ):
+            return None
+        return prediction
+
+    def status(self):
+        """one line about a failing model.predict, None while predictions work"""
+        if self.error is not None:
+            return "prediction failed: {}".format(self.error)
+        return None
+
+    def close(self):
+        """stop the worker thread without waiting for it (it is a daemon): a
+        predict in flight finishes in the background, a waiting request is dropped"""
+        with self.condition:
+            self.running = False
+            self.pending = None
+            self.thread = None
+            self.condition.notify_all()
+
+
+class CachedModel:
+    """bounded LRU cache in front of a model's predict, keyed on the input rows.
+    the viewer's states are small integers that repeat from frame to frame,
+    so most rows are answered without a forward pass. a new model (loaded or
+    retrained) gets a new CachedModel, so nothing stale is ever returned"""
+
+    def __init__(self, model, max_size=4096):
+        self.model = model
+        self.max_size = max_size
+        self.cache = collections.OrderedDict()  # { row bytes: prediction row }
+        self.lock = threading.Lock()  # predict may run in an AsyncPredictor thread
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, x, **kwargs):
+        """like model.predict, only rows not seen recently are passed on"""
+        x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+        keys = [row.tobytes() for row in x]
+        rows = [None] * len(keys)
+        missing = []
+        with self.lock:
+            for n, key in enumerate(keys):
+                row = self.cache.get(key)
+                if row is None:
+                    missing.append(n)
+                else:
+                    self.cache.move_to_end(key)
+                    rows[n] = row
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            predictions = np.asarray(self.model.predict(x[missing]))
+            with self.lock:
+                for n, row in zip(missing, predictions):
+                    rows[n] = row
+                    self.cache[keys[n]] = row
+                while len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
+        return np.stack(rows)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        print(
+            "cache: {} of {} rows, {} hits, {} misses".format(
+                len(self.cache), self.max_size, self.hits, self.misses
+            )
+        )
+        self.model.summary()
@@ -0,0 +1,137 @@
+"""
+geometric intercept solver for the moving target run
+
+a MovingTarget moves up or down the line x = TARGET_X at constant speed and
+bounces on the upper and lower screen edge, a SmarterRocket flies straight from
+the cannon at constant speed. the aim point y must be where the target is when
+the rocket gets there:
+
+    y = target_y_after(flight_time(y))
+
+flight_time(y) is the distance from the cannon to (TARGET_X, y) divided by the
+rocket speed. the bounces are unfolded into a triangle wave, so the target
+position after t seconds is a closed form. the equation is solved by fixed-point
+iteration, which converges because the target (50 px/s) is slower than the
+rocket (200 px/s): every iteration shrinks the error by tspeed / rspeed.
+
+solve() works on arrays of targets and cannons, solve_one() on plain floats for
+a single aim point per frame. InterceptModel puts it behind the predict()
+interface of EvolvedAgent's model (rows of [target speed, rocket speed,
+target y, direction]), so PredCrosshair can aim without a neural network.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import math
+import numpy as np
+from simulation import CANNON, ROCKET_SPEED, TARGET_SPEED, TARGET_X, HEIGHT
+
+AREA = (0, HEIGHT)  # upper and lower edge the target bounces on
+
+
+def fold(y, top, bottom):
+    """unfolded position y folded back between top and bottom (triangle wave)"""
+    length = bottom - top
+    p = np.mod(y - top, 2 * length)
+    return top + np.where(p > length, 2 * length - p, p)
+
+
+def target_after(target_y, velocity, seconds, area=AREA):
+    """y of a bouncing target after seconds, velocity < 0 moves up"""
+    return fold(target_y + velocity * seconds, *area)
+
+
+def solve(
+    target_y,
+    direction,
+    tspeed=TARGET_SPEED,
+    rspeed=ROCKET_SPEED,
+    cannon=CANNON,
+    target_x=TARGET_X,
+    area=AREA,
+    tolerance=1e-6,
+    max_iterations=50,
+):
+    """aim y (on x = target_x) for every target. direction 1 moves down, 0 up.
+    all arguments broadcast, cannon can be an (n, 2) array of cannon positions"""
+    target_y = np.asarray(target_y, dtype=np.float64)
+    velocity = np.where(np.asarray(direction) == 1, 1.0, -1.0) * tspeed
+    cannon = np.asarray(cannon, dtype=np.float64)
+    cx, cy = cannon[..., 0], cannon[..., 1]
+    dx = target_x - cx
+    aim = np.broadcast_to(target_y, np.broadcast(target_y, velocity, cx).shape)
+    for _ in range(max_iterations):
+        seconds = np.hypot(dx, aim - cy) / rspeed
+        new = target_after(target_y, velocity, seconds, area)
+        if np.all(np.abs(new - aim) < tolerance):
+            return new
+        aim = new
+    return aim
+
+
+def solve_one(
+    target_y,
+    direction,
+    tspeed=TARGET_SPEED,
+    rspeed=ROCKET_SPEED,
+    cannon=CANNON,
+    target_x=TARGET_X,
+    area=AREA,
+    tolerance=1e-6,
+    max_iterations=50,
+):
+    """solve() for a single target with plain floats, a few microseconds"""
+    top, bottom = area
+    length = bottom - top
+    velocity = tspeed if direction == 1 else -tspeed
+    dx = target_x - cannon[0]
+    aim = target_y
+    for _ in range(max_iterations):
+        seconds = math.hypot(dx, aim - cannon[1]) / rspeed
+        p = (target_y + velocity * seconds - top) % (2 * length)
+        new = top + (2 * length - p if p > length else p)
+        if abs(new - aim) < tolerance:
+            return new
+        aim = new
+    return aim
+
+
+class InterceptModel:
+    """aim points with the predict() interface of EvolvedAgent's model:
+    rows of [target speed, rocket speed, target y, direction] in,
+    (n, 1) array of aim y out"""
+
+    def __init__(self, cannon=CANNON, target_x=TARGET_X, area=AREA):
+        self.cannon = cannon
+        self.target_x = target_x
+        self.area = area
+
+    def predict(self, X, **kwargs):
+        X = np.atleast_2d(X)
+        if len(X) == 1:  # one aim point per frame: skip the array overhead
+            tspeed, rspeed, target_y, direction = (float(v) for v in X[0])
+            aim = solve_one(
+                target_y,
+                direction,
+                tspeed,
+                rspeed,
+                self.cannon,
+                self.target_x,
+                self.area,
+            )
+            return np.array([[aim]], dtype=np.float32)
+        aim = solve(
+            X[:, 2],
+            X[:, 3],
+            X[:, 0],
+            X[:, 1],
+            self.cannon,
+            self.target_x,
+            self.area,
+        )
+        return aim.astype(np.float32)[:, None]
+
+    def summary(self):
+        print("InterceptModel: cannon {}, x = {}".format(self.cannon, self.target_x))
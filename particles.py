@@ -0,0 +1,127 @@
+"""
+pooled smoke particles
+
+all smoke of the viewer lives in one SmokePool: a fixed number of slots with
+position, age and color kept in numpy arrays. nothing is allocated per particle
+or per frame; every particle is drawn with a pre-rendered frame for its
+(radius, color, alpha) bucket. when the budget is used up, a new particle
+replaces the oldest one.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import numpy as np
+import pygame
+
+
+class SmokePool:
+    """fixed-capacity smoke: grows from radius 0 to end_radius and fades out
+    from alpha_start to 0 during max_age seconds, drifting with the wind"""
+
+    def __init__(
+        self,
+        capacity=2000,
+        max_age=7.5,
+        end_radius=10,
+        alpha_start=64,
+        alpha_steps=16,
+        area=None,  # pygame.Rect, particles outside are removed
+    ):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.end_radius = end_radius
+        self.alpha_start = alpha_start
+        self.alpha_steps = alpha_steps
+        self.area = area
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.age = np.zeros(capacity)
+        self.color = np.zeros(capacity, dtype=np.int32)  # index into self.colors
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.next = 0  # slot for the next particle
+        self.colors = []  # distinct colors seen so far
+        self.color_index = {}  # { color: index }
+        self.frames = {}  # { color index: [[surface per alpha step] per radius] }
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def clear(self):
+        self.alive[:] = False
+
+    def spawn(self, x, y, color):
+        """add one particle, replacing the oldest one if the pool is full"""
+        color = tuple(color)
+        if color not in self.color_index:
+            self.color_index[color] = len(self.colors)
+            self.colors.append(color)
+            self.frames[self.color_index[color]] = self.render(color)
+        # slots are reused round-robin: with one max_age for all particles the
+        # next slot is always free or holds the oldest particle
+        i = self.next
+        self.next = (i + 1) % self.capacity
+        self.x[i], self.y[i] = x, y
+        self.age[i] = 0
+        self.color[i] = self.color_index[color]
+        self.alive[i] = True
+
+    def render(self, color):
+        """pre-render the frames of one color: frames[radius][alpha step]"""
+        convert = pygame.display.get_surface() is not None
+        frames = []
+        for radius in range(self.end_radius + 1):
+            row = []
+            for step in range(self.alpha_steps):
+                image = pygame.Surface((2 * radius, 2 * radius))
+                if radius > 0:
+                    pygame.draw.circle(image, color, (radius, radius), radius)
+                image.set_colorkey((0, 0, 0))
+                if convert:
+                    image = image.convert()
+                image.set_alpha(self.alpha_start * (step + 1) // self.alpha_steps)
+                row.append(image)
+            frames.append(row)
+        return frames
+
+    def update(self, seconds, wind=(0, 0)):
+        """age all particles and let them drift.
+        like the old Smoke sprite, the drift per frame is wind * seconds * seconds"""
+        alive = self.alive
+        self.age[alive] += seconds
+        self.x[alive] += wind[0] * seconds * seconds
+        self.y[alive] += wind[1] * seconds * seconds
+        dead = self.age > self.max_age
+        if self.area is not None:
+            dead |= (self.x < self.area.left) | (self.x > self.area.right)
+            dead |= (self.y < self.area.top) | (self.y > self.area.bottom)
+        alive &= ~dead
+
+    def draw(self, surface):
+        """blit every living particle with its pre-rendered frame,
+        returns the list of rects drawn"""
+        i = np.flatnonzero(self.alive)
+        if len(i) == 0:
+            return []
+        age = self.age[i]
+        radius = np.rint(self.end_radius / self.max_age * age).astype(int)
+        np.clip(radius, 0, self.end_radius, out=radius)
+        fade = 1 - age / self.max_age  # 1 at birth, 0 at max_age
+        step = np.clip((fade * self.alpha_steps).astype(int), 0, self.alpha_steps - 1)
+        left = np.rint(self.x[i]).astype(int) - radius
+        top = np.rint(self.y[i]).astype(int) - radius
+        frames = self.frames
+        return surface.blits(
+            [
+                (frames[c][r][s], (x, y))
+                for c, r, s, x, y in zip(
+                    self.color[i].tolist(),
+                    radius.tolist(),
+                    step.tolist(),
+                    left.tolist(),
+                    top.tolist(),
+                )
+                if r > 0
+            ],
+        )
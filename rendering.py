@@ -0,0 +1,83 @@
+"""
+dirty-rect rendering
+
+DirtyRenderer repaints only the parts of the screen that changed. every frame
+the areas drawn in the last frame are restored from the background, everything
+is drawn again and every draw reports its rect with mark(). only the old and new
+rects are sent to the display. when more than threshold of the screen is dirty,
+a frame falls back to a full redraw (blit the whole background, flip).
+
+usage in a main loop:
+    renderer.begin()
+    renderer.mark(write(screen, ...))
+    renderer.mark(allgroup.draw(screen))
+    renderer.end()
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import pygame
+
+
+class DirtyRenderer:
+    """tracks the dirty rects of a screen drawn on top of a background"""
+
+    def __init__(self, screen, background, threshold=0.5, enabled=True):
+        self.screen = screen
+        self.background = background
+        self.threshold = threshold  # fraction of the screen, above: full redraw
+        self.enabled = enabled  # False: always full redraw, like before
+        self.screenrect = screen.get_rect()
+        self.previous = []  # rects drawn in the last frame
+        self.current = []  # rects drawn in this frame
+        self.full = True  # the whole screen must be drawn in this frame
+        self.full_frames = 0  # statistics: frames drawn completely...
+        self.dirty_frames = 0  # ...and frames drawn with dirty rects
+
+    def invalidate(self):
+        """redraw everything in the next frame, e.g. after the background changed"""
+        self.full = True
+
+    def area(self, rects):
+        """summed area of rects (overlaps counted twice)"""
+        return sum(rect.width * rect.height for rect in rects)
+
+    def too_dirty(self, rects):
+        limit = self.threshold * self.screenrect.width * self.screenrect.height
+        return self.area(rects) > limit
+
+    def begin(self):
+        """restore the background where the last frame drew something"""
+        if not self.enabled or self.full or self.too_dirty(self.previous):
+            self.screen.blit(self.background, (0, 0))
+            self.full = True
+        else:
+            blit = self.screen.blit
+            for rect in self.previous:
+                blit(self.background, rect, rect)
+        self.current = []
+
+    def mark(self, rects):
+        """report the rect (or list of rects, or None) of something just drawn,
+        returns rects"""
+        if rects is None:
+            return rects
+        if isinstance(rects, pygame.Rect):
+            self.current.append(rects.clip(self.screenrect))
+        else:
+            screenrect = self.screenrect
+            self.current.extend(rect.clip(screenrect) for rect in rects)
+        return rects
+
+    def end(self):
+        """show the frame: only the dirty rects, or everything"""
+        if self.full or self.too_dirty(self.current):
+            pygame.display.flip()
+            self.full_frames += 1
+        else:
+            pygame.display.update(self.previous + self.current)
+            self.dirty_frames += 1
+        self.previous = [rect for rect in self.current if rect.width and rect.height]
+        self.full = False
@@ -9,10 +9,20 @@ website: simon.heppner.at
 import pygame
 import pygame.freetype  # not automatically loaded when importing pygame!
 import pygame.gfxdraw
+import functools
 import random
 import math
+import os
 import agent
-from keras.models import load_model
+import collision
+import inference
+import intercept
+import simulation
+import particles
+import rendering
+import timestep
+import binarydataset
+from datasink import DatasetSink
 import numpy as np
 import time
 
@@ -21,6 +31,7 @@ class VectorSprite(pygame.sprite.Sprite):
     """base class for sprites. this class inherits from pygame sprite class"""
 
     number = 0  # unique number for each sprite
+    underlings = {}  # { boss: {underling: None} }, kept up to date by the boss property
 
     # numbers = {} # { number, Sprite }
 
@@ -31,11 +42,7 @@ class VectorSprite(pygame.sprite.Sprite):
         _layer=0,
         angle=0,
         radius=0,
-        color=(
-            random.randint(0, 255),
-            random.randint(0, 255),
-            random.randint(0, 255),
-        ),
+        color=None,  # None: the class color, or a new random color
         hitpoints=100,
         hitpointsfull=100,
         stop_on_edge=False,
@@ -66,6 +73,12 @@ class VectorSprite(pygame.sprite.Sprite):
             self.pos = pygame.math.Vector2(200, 200)
         if move is None:
             self.move = pygame.math.Vector2(0, 0)
+        if color is None:
+            self.color = getattr(type(self), "color", None) or (
+                random.randint(0, 255),
+                random.randint(0, 255),
+                random.randint(0, 255),
+            )
         self._overwrite_parameters()
 
         self.number = VectorSprite.number  # unique number for each sprite
@@ -139,14 +152,27 @@ class VectorSprite(pygame.sprite.Sprite):
         if "move_with_boss" not in kwargs:
             self.move_with_boss = False
 
+    @property
+    def boss(self):
+        return self.__dict__.get("boss")
+
+    @boss.setter
+    def boss(self, boss):
+        # register self as underling of boss, so kill() finds it without a search
+        old = self.__dict__.get("boss")
+        if old is not None and old in VectorSprite.underlings:
+            VectorSprite.underlings[old].pop(self, None)
+            if not VectorSprite.underlings[old]:
+                del VectorSprite.underlings[old]
+        self.__dict__["boss"] = boss
+        if boss is not None:
+            VectorSprite.underlings.setdefault(boss, {})[self] = None
+
     def kill(self):
         # check if this is a boss and kill all his underlings as well
-        tokill = [s for s in Viewer.allgroup if "boss" in s.__dict__ and s.boss == self]
-        # for s in Viewer.allgroup:
-        #    if "boss" in s.__dict__ and s.boss == self:
-        #        tokill.append(s)
-        for s in tokill:
+        for s in list(VectorSprite.underlings.pop(self, ())):
             s.kill()
+        self.boss = None  # leave the underlings of my own boss
         # if self.number in self.numbers:
         #   del VectorSprite.numbers[self.number] # remove Sprite from numbers dict
         pygame.sprite.Sprite.kill(self)
@@ -169,11 +195,22 @@ class VectorSprite(pygame.sprite.Sprite):
         self.angle += by_degree
         self.angle = self.angle % 360
         oldcenter = self.rect.center
-        self.image = pygame.transform.rotate(self.image0, -self.angle)
-        self.image.convert_alpha()
+        self.image = self.rotated_image()
         self.rect = self.image.get_rect()
         self.rect.center = oldcenter
 
+    def rotation_key(self):
+        """key under which RotationCache shares rotated images of this sprite.
+        None (the default) means the image is unique and rotated every time"""
+        return None
+
+    def rotated_image(self):
+        """image0 rotated by self.angle, from the RotationCache if possible"""
+        key = self.rotation_key()
+        if key is None:
+            return pygame.transform.rotate(self.image0, -self.angle)
+        return RotationCache.get(key, self.image0, self.angle)
+
     def get_angle(self):
         if self.angle > 180:
             return self.angle - 360
@@ -184,13 +221,13 @@ class VectorSprite(pygame.sprite.Sprite):
         self.angle = degree
         self.angle = self.angle % 360
         oldcenter = self.rect.center
-        self.image = pygame.transform.rotate(self.image0, -self.angle)
-        self.image.convert_alpha()
+        self.image = self.rotated_image()
         self.rect = self.image.get_rect()
         self.rect.center = oldcenter
 
     def update(self, seconds):
         """calculate movement, position and bouncing on edge"""
+        self.previous_pos = pygame.math.Vector2(self.pos)  # for interpolation
         self.age += seconds
         if self.age < 0:
             return
@@ -265,6 +302,37 @@ class VectorSprite(pygame.sprite.Sprite):
                 self.pos.y = self.area.top
 
 
+class RotationCache:
+    """pre-rotated images shared by all sprites with the same rotation_key,
+    e.g. (class, color). angles are rounded to multiples of step degrees"""
+
+    step = 3  # degrees, should divide 360
+    base = {}  # { key: unrotated image0 }
+    images = {}  # { (key, angle bucket): rotated image }
+
+    @classmethod
+    def base_image(cls, key, draw):
+        """the unrotated picture for key, drawn once with draw()"""
+        if key not in cls.base:
+            cls.base[key] = draw()
+        return cls.base[key]
+
+    @classmethod
+    def get(cls, key, image0, angle):
+        """image0 rotated by angle (rounded to step), drawn only on first use"""
+        bucket = int(round(angle / cls.step)) % int(round(360 / cls.step))
+        image = cls.images.get((key, bucket))
+        if image is None:
+            image = pygame.transform.rotate(image0, -bucket * cls.step)
+            cls.images[(key, bucket)] = image
+        return image
+
+    @classmethod
+    def clear(cls):
+        cls.base.clear()
+        cls.images.clear()
+
+
 class Crosshair(VectorSprite):
     def create_image(self):
         self.image = pygame.Surface((100, 100))
@@ -284,6 +352,13 @@ class Crosshair(VectorSprite):
 
 
 class PredCrosshair(VectorSprite):
+
+    max_staleness = 0.25  # seconds, older predictions are not shown
+
+    def _overwrite_parameters(self):
+        # predictions run in a worker thread, the frame uses the newest result
+        self.predictor = inference.AsyncPredictor(self.max_staleness)
+
     def create_image(self):
         self.image = pygame.Surface((100, 100))
         for radius in (5, 10, 15, 20, 25, 30):
@@ -296,28 +371,33 @@ class PredCrosshair(VectorSprite):
         self.rect = self.image.get_rect()
         self.rect.center = pygame.math.Vector2(50, 50)
 
-    def update(self, seconds, agent=None, targetpos=None, direction=0, tspeed=(0,50), pspeed=(0,200)):
-        if agent != None:
+    def update(self, seconds, model=None, targetpos=None, direction=0, tspeed=(0,50), pspeed=(0,200)):
+        # model: anything with predict(), a loaded agent or intercept.InterceptModel
+        if model is not None:
             if targetpos != None:
-                prediction = round(
-                    agent.model.predict(
-                        np.array(
+                self.predictor.submit(
+                    model,
+                    np.array(
+                        [
                             [
-                                [
-                                    round(tspeed[1]),
-                                    round(pspeed[1]),
-                                    int(targetpos.y),
-                                    direction,
-
-                                ]
-                            ],
-                            dtype=np.float32,
-                        )
-                    )[0][0]
+                                round(tspeed[1]),
+                                round(pspeed[1]),
+                                int(targetpos.y),
+                                direction,
+                            ]
+                        ],
+                        dtype=np.float32,
+                    ),
                 )
-                self.pos = pygame.math.Vector2(800, prediction)
+            prediction = self.predictor.result()
+            if prediction is not None:
+                self.pos = pygame.math.Vector2(800, round(prediction[0][0]))
         super().update(seconds)
 
+    def kill(self):
+        self.predictor.close()
+        super().kill()
+
 
 class Flytext(VectorSprite):
     def __init__(
@@ -511,11 +591,23 @@ class Beam(VectorSprite):
         self.kill_on_edge = True
         # self.color = randomize_colors(self.color, 50)
 
+    def rotation_key(self):
+        return type(self), tuple(self.color)
+
     def create_image(self):
+        # all beams of one class and color share one (randomized) picture
+        self.image0 = RotationCache.base_image(self.rotation_key(), self.draw_beam)
+        self.image = self.image0
+        self.imagecolor = self.color
+        self.rect = self.image.get_rect()
+        self.rect.center = int(self.pos.x), int(self.pos.y)
+        self.set_angle(self.angle)
+
+    def draw_beam(self):
         r, g, b = randomize_colors(self.color, 50)
-        self.image = pygame.Surface((self.width, self.height))
+        image = pygame.Surface((self.width, self.height))
         pygame.gfxdraw.filled_polygon(
-            self.image,
+            image,
             (
                 (0, self.height // 2),
                 (self.width * 0.9, 0),
@@ -524,13 +616,8 @@ class Beam(VectorSprite):
             ),
             (r, g, b),
         )
-        self.image.set_colorkey((0, 0, 0))
-        self.image.convert_alpha()
-        self.image = pygame.transform.rotate(self.image, 180)
-        self.image0 = self.image.copy()
-        self.rect = self.image.get_rect()
-        self.rect.center = int(self.pos.x), int(self.pos.y)
-        self.set_angle(self.angle)
+        image.set_colorkey((0, 0, 0))
+        return pygame.transform.rotate(image, 180)
 
 
 class Rocket(Beam):
@@ -546,7 +633,7 @@ class Rocket(Beam):
         # self.create_image()
         super().update(seconds)
         if random.random() < 0.7:
-            Smoke(pos=pygame.math.Vector2(self.pos.x, self.pos.y))
+            Viewer.smoke.spawn(self.pos.x, self.pos.y, self.color)
         # tumble
         # if random.random() < 0.1:
         delta_angle = random.choice((-3, -2, -1, 0, 0, 0, 0, 0, 0, 1, 2, 3))
@@ -556,6 +643,8 @@ class Rocket(Beam):
 
 class SmarterRocket(Beam):
 
+    datasetfile = "movingdataset.txt"  # a .rkd file is written in binary
+
     def _overwrite_parameters(self):
         self.speed = (0,200)
         self.targetSpeed = (0,50)
@@ -565,36 +654,39 @@ class SmarterRocket(Beam):
             self.targetSpeed = tspeed
         if winner:
             if writeData:
-                with open("movingdataset.txt", "a") as dataset:
-                    dataset.write(
-                        str(int(self.targetSpeed[1]))
-                        + ","
-                        + str(self.speed[1])
-                        + ","
-                        + str(int(self.moving_target_pos[1]))
-                        + ","
-                        + str(self.direction)
-                        + ","
-                        + str(int(self.target[1]))
-                        + "\n"
+                DatasetSink.get(self.datasetfile, binarydataset.MOVING).write(
+                    simulation.moving_dataset_row(
+                        self.targetSpeed[1],
+                        self.speed[1],
+                        self.moving_target_pos[1],
+                        self.direction,
+                        self.target[1],
                     )
+                )
         super().kill()
 
 class SmartRocket(Rocket):
+
+    datasetfile = "dataset.txt"  # a .rkd file is written in binary
+
     def _overwrite_parameters(self):
         self.kill_on_edge = True
         self.move = pygame.math.Vector2(50, 0)
         self.pos = pygame.math.Vector2(50, 400)
-        self.factor1 = 0.1 + random.random() * 5.5
-        self.factor2 = 5.0 + random.random() * 60
-        self.factor3 = random.choice((-1, 1))
-        self.factor4 = random.choice((-1, 1))
+        if "factor1" not in self.__dict__:  # factors can be given as keyword arguments
+            (
+                self.factor1,
+                self.factor2,
+                self.factor3,
+                self.factor4,
+            ) = simulation.random_factors()
         self.writeData = False
         self.smokeToggle = True
         self.target = (200, Viewer.height - 200, 800)
 
     def update_old(self, seconds):
         """calculate movement, position and bouncing on edge"""
+        self.previous_pos = pygame.math.Vector2(self.pos)  # for interpolation
         self.age += seconds
         if self.age < 0:
             return
@@ -619,11 +711,12 @@ class SmartRocket(Rocket):
         self.rect.center = (int(round(self.pos.x, 0)), int(round(self.pos.y, 0)))
 
     def update(self, seconds):
-        self.create_image()
+        if self.color != self.imagecolor:  # color changed since the last picture
+            self.create_image()
         self.update_old(seconds)
         if self.smokeToggle:
             if random.random() < 0.7:
-                Smoke(pos=pygame.math.Vector2(self.pos.x, self.pos.y), color=self.color)
+                Viewer.smoke.spawn(self.pos.x, self.pos.y, self.color)
         # tumble
         # if random.random() < 0.1:
         # delta_angle = random.choice((-3,-2,-1,0,0,0,0,0,0,1,2,3))
@@ -653,37 +746,71 @@ class SmartRocket(Rocket):
 
     def kill(self, winner=0, sparks=False):
         if self.writeData:
-            with open("dataset.txt", "a") as dataset:
-                dataset.write(
-                    str(round(self.factor1, 1))
-                    + ","
-                    + str(round(self.factor2, 1))
-                    + ","
-                    + str(round(self.factor3, 1))
-                    + ","
-                    + str(round(self.factor4, 1))
-                    + ","
-                    + str(winner)
-                    + "\n"
+            DatasetSink.get(self.datasetfile, binarydataset.STATIC).write(
+                simulation.dataset_row(
+                    (self.factor1, self.factor2, self.factor3, self.factor4), winner
                 )
+            )
         if sparks:
             Explosion(pos=self.pos, color=self.color, maxduration=0.5, sparksmax=5)
         super().kill()
 
 
-class Spark(VectorSprite):
-    def _overwrite_parameters(self):
-        self._layer = 9
-        self.kill_on_edge = True
-        self.color = randomize_colors(self.color, 50)
+class Particle(pygame.sprite.Sprite):
+    """lean base class for sprites created by the hundreds, like sparks.
+    unlike VectorSprite the constructor takes plain arguments instead of copying
+    locals(), and everything shared by all particles of a class (layer, edge
+    handling, area) is a class attribute instead of an instance attribute"""
+
+    groups = ()
+    _layer = 0
+    kill_on_edge = True
+    area = None  # pygame.Rect, None: Viewer.screenrect
+
+    def __init__(self, pos, move, angle=0, max_age=None, color=(255, 255, 0)):
+        pygame.sprite.Sprite.__init__(self, self.groups)
+        self.pos = pos
+        self.move = move
+        self.angle = angle
+        self.age = 0
+        self.max_age = max_age
+        self.color = color
+        self.create_image()
 
     def create_image(self):
-        self.image = pygame.Surface((10, 10))
-        pygame.draw.line(self.image, self.color, (10, 5), (5, 5), 3)
-        pygame.draw.line(self.image, self.color, (5, 5), (2, 5), 1)
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
-        self.image0 = self.image.copy()
+        self.image = pygame.Surface((2, 2))
+        self.image.fill(self.color)
+        self.rect = self.image.get_rect(center=(round(self.pos.x), round(self.pos.y)))
+
+    def update(self, seconds):
+        self.age += seconds
+        if self.max_age is not None and self.age > self.max_age:
+            self.kill()
+            return
+        self.pos += self.move * seconds
+        if self.kill_on_edge and not (self.area or Viewer.screenrect).collidepoint(
+            self.pos
+        ):
+            self.kill()
+            return
+        self.rect.center = (round(self.pos.x), round(self.pos.y))
+
+
+class Spark(Particle):
+    _layer = 9
+
+    def __init__(self, pos, move, angle=0, max_age=None, color=(255, 255, 0)):
+        super().__init__(pos, move, angle, max_age, randomize_colors(color, 50))
+
+    def create_image(self):
+        image = pygame.Surface((10, 10))
+        pygame.draw.line(image, self.color, (10, 5), (5, 5), 3)
+        pygame.draw.line(image, self.color, (5, 5), (2, 5), 1)
+        image.set_colorkey((0, 0, 0))
+        if self.angle % 360 != 0:
+            image = pygame.transform.rotate(image, -self.angle)
+        self.image = image
+        self.rect = image.get_rect(center=(round(self.pos.x), round(self.pos.y)))
 
 
 class Explosion:
@@ -704,7 +831,6 @@ class Explosion:
             v = pygame.math.Vector2(1, 0)  # vector aiming right (0°)
             a = random.triangular(a1, a2)
             v.rotate_ip(a)
-            g = pygame.math.Vector2(0, -gravityy)
             speed = random.randint(minspeed, maxspeed)  # 150
             duration = random.random() * maxduration
             Spark(
@@ -713,7 +839,6 @@ class Explosion:
                 move=v * speed,
                 max_age=duration,
                 color=color,
-                gravity=g,
             )
 
 
@@ -729,54 +854,6 @@ class MovingTarget(VectorSprite):
         self.rect = self.image.get_rect()
         self.rect.center = self.pos.x, self.pos.y
 
-class Smoke(VectorSprite):
-    """a round fragment or bubble particle, fading out"""
-
-    def _overwrite_parameters(self):
-        # self.speed = random.randint(10, 50)
-        self.start_radius = 1
-
-        self.radius = 1
-        self.end_radius = 10  # random.randint(15,20)
-        # if self.max_age is None:
-        self.max_age = 7.5  # + random.random() * 2.5
-        self.kill_on_edge = True
-        self.kill_with_boss = False  # VERY IMPORTANT!!!
-        # if self.move == pygame.math.Vector2(0, 0):
-        #    self.move = pygame.math.Vector2(1, 0)
-        #    self.move *= self.speed
-        #    a, b = 0, 360
-        #    self.move.rotate_ip(random.randint(a, b))
-        self.alpha_start = 64
-        self.alpha_end = 0
-        self.alpha_diff_per_second = (self.alpha_start - self.alpha_end) / self.max_age
-        # self.color = (10, 10, 10)
-        # self.color = randomize_colors(color=self.color, by=35)
-
-    def create_image(self):
-        # self.radius = self.start_radius +
-        self.image = pygame.Surface((2 * self.radius, 2 * self.radius))
-        pygame.draw.circle(
-            self.image, self.color, (self.radius, self.radius), self.radius
-        )
-        self.image.set_colorkey((0, 0, 0))
-        self.image.set_alpha(self.alpha_start - self.age * self.alpha_diff_per_second)
-        self.image.convert_alpha()
-        self.rect = self.image.get_rect()
-        self.rect.center = int(round(self.pos.x, 0)), int(round(self.pos.y, 0))
-        # self.rect.center=(int(round(self.pos[0],0)), int(round(self.pos[1],0)))
-
-    def update(self, seconds):
-        # self.create_image()
-        self.radius = (self.end_radius / self.max_age) * self.age
-        self.radius = int(round(self.radius, 0))
-        self.create_image()
-        self.move = Viewer.windvector * seconds
-        super().update(seconds)
-        self.image.set_alpha(self.alpha_start - self.age * self.alpha_diff_per_second)
-        self.image.convert_alpha()
-
-
 class Viewer:
     width = 0
     height = 0
@@ -797,8 +874,14 @@ class Viewer:
         self,
         width=800,
         height=600,
+        dirty_rects=True,  # False: redraw the whole screen every frame
+        sim_rate=60,  # simulation steps per simulated second
+        fast_forward=None,  # speed of the F key, None: as fast as possible
     ):
 
+        self.dirty_rects = dirty_rects
+        self.timestep = timestep.FixedTimestep(rate=sim_rate)
+        self.fast_forward = fast_forward
         Viewer.width = width
         Viewer.height = height
         Viewer.screenrect = pygame.Rect(0, 0, width, height)
@@ -875,24 +958,31 @@ class Viewer:
 
         self.background = pygame.Surface((Viewer.width, Viewer.height))
         self.background.fill((255, 255, 255))
+        self.renderer = rendering.DirtyRenderer(
+            self.screen, self.background, enabled=self.dirty_rects
+        )
 
-        self.trained_agent = agent.TrainedAgent(actions=[0, 1])
+        self.trained_agent = agent.TrainedAgent(actions=[0, 1], backend="lut")
         # X, Y = agent.loaddataset("dataset.txt", 4)
         # self.trained_agent.train(X, Y, savemodel=True)
-        model = load_model("model.h5")
-        self.trained_agent.loadmodel(model)
-
-        self.movingAgent = agent.EvolvedAgent(actions=[0])
-        X, Y = agent.loaddataset("movingdataset.txt", 4)
-        self.movingAgent.train(X, Y, savemodel=True)
-        #model = load_model("movingmodel.h5")
-        #self.movingAgent.loadmodel(model)
+        self.trained_agent.loadmodel("model.h5")
+
+        self.movingAgent = agent.EvolvedAgent(actions=[0], backend="numpy")
+        # the last saved model serves until the background training is done,
+        # which retrains only when movingdataset.txt or the model config changed
+        if os.path.exists(self.movingAgent.modelfile):
+            self.movingAgent.loadmodel(self.movingAgent.modelfile)
+        self.training = self.movingAgent.train_async("movingdataset.txt", 4)
+        # the crosshair aims with the geometric solver, movingAgent with the M key
+        self.interceptModel = intercept.InterceptModel(area=(0, Viewer.height))
+        self.aimingModel = self.interceptModel
 
     def prepare_sprites(self):
         """painting on the surface and create sprites"""
         Viewer.allgroup = pygame.sprite.LayeredUpdates()  # for drawing with layers
         Viewer.beamgroup = pygame.sprite.Group()
         Viewer.targetgroup = pygame.sprite.Group()
+        Viewer.smoke = particles.SmokePool(capacity=2000, area=Viewer.screenrect)
         # assign classes to groups
         VectorSprite.groups = self.allgroup
         Beam.groups = self.allgroup, self.beamgroup
@@ -985,16 +1075,20 @@ class Viewer:
         a = (a + delta_a) % 360
         Viewer.windvector.from_polar((r, a))
         # --- draw windrose ---
-        write(
-            self.screen,
-            "wind: {:.0f} pixel/sec,  {:.0f}° ".format(r, 360 - a),
-            x=5,
-            y=Viewer.height - 115,
-            color=(128, 128, 128),
-            font_size=12,
+        self.renderer.mark(
+            write(
+                self.screen,
+                "wind: {:.0f} pixel/sec,  {:.0f}° ".format(r, 360 - a),
+                x=5,
+                y=Viewer.height - 115,
+                color=(128, 128, 128),
+                font_size=12,
+            )
         )
-        pygame.draw.circle(
-            self.screen, (128, 128, 128), (50, Viewer.height - 50), 50, 1
+        self.renderer.mark(
+            pygame.draw.circle(
+                self.screen, (128, 128, 128), (50, Viewer.height - 50), 50, 1
+            )
         )
         # ---- calculate wind triangle -----
         p0 = pygame.math.Vector2(50, Viewer.height - 50)  # center of circle
@@ -1008,11 +1102,13 @@ class Viewer:
         p2 = p0 + p2
         p3 = p0 + p3
         c = int(round(r / Viewer.maxwind * 255, 0))
-        pygame.draw.polygon(
-            self.screen,
-            (c, c, c),
-            [(int(round(p.x, 0)), int(round(p.y, 0))) for p in (p0, p2, p1, p3)],
-            5,
+        self.renderer.mark(
+            pygame.draw.polygon(
+                self.screen,
+                (c, c, c),
+                [(int(round(p.x, 0)), int(round(p.y, 0))) for p in (p0, p2, p1, p3)],
+                5,
+            )
         )
         # p4 = p0 - p1
         # pygame.draw.circle(self.screen, (200,0,0), (int(p1.x), int(p1.y)), 5)
@@ -1046,42 +1142,61 @@ class Viewer:
                         if activeitem == "Static-Target Rockets":
                             self.menu_active = False
                             self.staticTargetRun()
+                            self.renderer.invalidate()
                         elif activeitem == "Moving-Target Rockets":
                             self.menu_active = False
                             self.movingTargetRun()
+                            self.renderer.invalidate()
                         elif activeitem == "Quit":
                             return
 
             # ---------- clear all --------------
             pygame.display.set_caption("Rocket Simulator | Menu")
             pygame.display.set_icon(self.icon)
-            self.screen.blit(self.background, (0, 0))
+            self.renderer.begin()
+            mark = self.renderer.mark
 
             # ----------- writing on screen ----------
             for y, i in enumerate(Viewer.menuitems):
+                mark(
+                    write(
+                        self.screen,
+                        i,
+                        Viewer.width // 2 - 100,
+                        320 + y * 40,
+                        color=(0, 0, 0),
+                        font_size=40,
+                    )
+                )
+            mark(
                 write(
                     self.screen,
-                    i,
-                    Viewer.width // 2 - 100,
-                    320 + y * 40,
-                    color=(0, 0, 0),
+                    "-->",
+                    Viewer.width // 2 - 185,
+                    320 + Viewer.cursorindex * 40,
+                    color=(0, 0, random.randint(200, 255)),
                     font_size=40,
                 )
-            write(
-                self.screen,
-                "-->",
-                Viewer.width // 2 - 185,
-                320 + Viewer.cursorindex * 40,
-                color=(0, 0, random.randint(200, 255)),
-                font_size=40,
+            )
+            mark(
+                write(
+                    self.screen,
+                    "moving-target agent: " + self.training.status(),
+                    Viewer.width // 2 - 185,
+                    320 + len(Viewer.menuitems) * 40 + 20,
+                    color=(128, 128, 128),
+                    font_size=20,
+                )
             )
 
             # --------- update all sprites ----------------
             self.allgroup.update(seconds)
+            Viewer.smoke.update(seconds, Viewer.windvector)
 
             # ---------- blit all sprites --------------
-            self.allgroup.draw(self.screen)
-            pygame.display.flip()
+            mark(Viewer.smoke.draw(self.screen))
+            mark(self.allgroup.draw(self.screen))
+            self.renderer.end()
         return
 
     def staticTargetRun(self):
@@ -1092,10 +1207,17 @@ class Viewer:
         click_oldleft, click_oldmiddle, click_oldright = False, False, False
         for _ in self.allgroup:
             _.kill()
+        Viewer.smoke.clear()
+        self.swarm = None  # simulation.RocketSwarm, launched with the S key
+        pygame.draw.line(
+            self.background, (0, 0, 255), (800, 200), (800, Viewer.height - 200)
+        )
+        self.renderer.invalidate()
+        self.timestep.reset()
         # points = []
         # --------------------------- main loop --------------------------
         while running:
-            milliseconds = self.clock.tick(self.fps)  #
+            milliseconds = self.clock.tick(self.timestep.tick_fps(self.fps))  #
             seconds = milliseconds / 1000
             self.playtime += seconds
             # -------- events ------
@@ -1106,141 +1228,48 @@ class Viewer:
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         return
+                    if event.key == pygame.K_f:
+                        self.toggle_fast_forward()
+                    if event.key == pygame.K_s:
+                        # a whole swarm of rockets, drawn as dots without sprites
+                        self.swarm = simulation.RocketSwarm(
+                            simulation.random_factors_array(1000),
+                            target=(200, Viewer.height - 200, 800),
+                            area=(0, 0, Viewer.width, Viewer.height),
+                        )
                     if event.key == pygame.K_SPACE:
-                        for _ in range(5):
-                            rocket = SmartRocket(
-                                pos=pygame.math.Vector2(100, 400),
-                                move=pygame.math.Vector2(50, 0),
-                                angle=0,
-                                kill_on_edge=True,
-                                max_distance=2 * Viewer.width,
-                                color=(0, 0, 0),
-                            )
-                            rocket.writeData = False
-                            rocket.target = (200, Viewer.height - 200, 800)
-                            rocket.smokeToggle = False
-                            # featureString = str(round(rocket.factor1, 1)) + "," + str(round(rocket.factor2, 1)) + "," + str(round(rocket.factor3, 1)) + "," + str(round(rocket.factor4, 1))
-                            prediction = round(
-                                self.trained_agent.model.predict(
-                                    np.array(
-                                        [
-                                            [
-                                                round(rocket.factor1, 1),
-                                                round(rocket.factor2, 1),
-                                                round(rocket.factor3, 1),
-                                                round(rocket.factor4, 1),
-                                            ]
-                                        ],
-                                        dtype=np.float32,
-                                    )
-                                )[0][0]
-                            )
-                            if prediction == 1:
-                                rocket.color = (0, 255, 0)
-                            else:
-                                rocket.color = (255, 0, 0)
-
+                        self.spawn_smart_rockets(5)
                     if event.key == pygame.K_a:
-                        i = 0
-                        while i < 5:
-                            rocket = SmartRocket(
-                                pos=pygame.math.Vector2(100, 400),
-                                move=pygame.math.Vector2(50, 0),
-                                angle=0,
-                                kill_on_edge=True,
-                                max_distance=2 * Viewer.width,
-                                color=(0, 0, 0),
-                            )
-                            rocket.writeData = False
-                            rocket.target = (200, Viewer.height - 200, 800)
-                            rocket.smokeToggle = False
-                            # featureString = str(round(rocket.factor1, 1)) + "," + str(round(rocket.factor2, 1)) + "," + str(round(rocket.factor3, 1)) + "," + str(round(rocket.factor4, 1))
-                            prediction = round(
-                                self.trained_agent.model.predict(
-                                    np.array(
-                                        [
-                                            [
-                                                round(rocket.factor1, 1),
-                                                round(rocket.factor2, 1),
-                                                round(rocket.factor3, 1),
-                                                round(rocket.factor4, 1),
-                                            ]
-                                        ],
-                                        dtype=np.float32,
-                                    )
-                                )[0][0]
-                            )
-                            if prediction == 1:
-                                rocket.color = (0, 255, 0)
-                                i += 1
-                            else:
-                                rocket.kill(sparks=False)
-
+                        self.spawn_smart_rockets(5, keep=1)
                     if event.key == pygame.K_b:
-                        i = 0
-                        while i < 5:
-                            rocket = SmartRocket(
-                                pos=pygame.math.Vector2(100, 400),
-                                move=pygame.math.Vector2(50, 0),
-                                angle=0,
-                                kill_on_edge=True,
-                                max_distance=2 * Viewer.width,
-                                color=(0, 0, 0),
-                            )
-                            rocket.writeData = False
-                            rocket.target = (200, Viewer.height - 200, 800)
-                            rocket.smokeToggle = False
-                            # featureString = str(round(rocket.factor1, 1)) + "," + str(round(rocket.factor2, 1)) + "," + str(round(rocket.factor3, 1)) + "," + str(round(rocket.factor4, 1))
-                            prediction = round(
-                                self.trained_agent.model.predict(
-                                    np.array(
-                                        [
-                                            [
-                                                round(rocket.factor1, 1),
-                                                round(rocket.factor2, 1),
-                                                round(rocket.factor3, 1),
-                                                round(rocket.factor4, 1),
-                                            ]
-                                        ],
-                                        dtype=np.float32,
-                                    )
-                                )[0][0]
-                            )
-                            if prediction == 1:
-                                rocket.kill(sparks=False)
-                            else:
-                                rocket.color = (255, 0, 0)
-                                i += 1
+                        self.spawn_smart_rockets(5, keep=0)
 
             # ------------ pressed keys ------
             pressed_keys = pygame.key.get_pressed()
             # ///
 
+            # --------- update all sprites in fixed steps ----------------
+            for _ in range(self.timestep.advance(seconds)):
+                self.static_step(self.timestep.dt)
+            if not self.timestep.render_due():
+                continue  # fast-forward: the simulation runs on, drawing waits
+
             # ---------- clear all --------------
             pygame.display.set_caption("Rocket Simulator | Static-Target")
             pygame.display.set_icon(self.icon)
-            self.screen.blit(self.background, (0, 0))
+            self.renderer.begin()
+            mark = self.renderer.mark
 
             # ----------- writing on screen ----------
-            write(
-                self.screen,
-                "FPS: {:6.3}".format(self.clock.get_fps()),
-                50,
-                50,
-                (0, 0, 250),
-                20,
-            )
-
-            pygame.draw.line(
-                self.background, (0, 0, 255), (800, 200), (800, Viewer.height - 200)
-            )
-
-            # --------- update all sprites ----------------
-            self.allgroup.update(seconds)
+            mark(self.write_fps())
 
             # ---------- blit all sprites --------------
-            self.allgroup.draw(self.screen)
-            pygame.display.flip()
+            timestep.interpolate(self.allgroup, self.timestep.alpha)
+            mark(Viewer.smoke.draw(self.screen))
+            mark(self.allgroup.draw(self.screen))
+            if self.swarm is not None:
+                mark(self.draw_swarm(self.swarm))
+            self.renderer.end()
 
         pygame.mouse.set_visible(True)
         pygame.quit()
@@ -1249,11 +1278,102 @@ class Viewer:
         # finally:
         #    pygame.quit()
 
+    def static_step(self, seconds):
+        """one fixed simulation step of staticTargetRun"""
+        self.allgroup.update(seconds)
+        Viewer.smoke.update(seconds, Viewer.windvector)
+        if self.swarm is not None:
+            self.swarm.step(seconds)
+
+    def toggle_fast_forward(self):
+        """switch between real time and fast_forward speed"""
+        if self.timestep.speed == 1.0:
+            self.timestep.speed = self.fast_forward
+        else:
+            self.timestep.speed = 1.0
+            self.timestep.accumulator = 0.0
+
+    def write_fps(self):
+        """write frames per second and simulation speed, returns the rect"""
+        speed = self.timestep.speed
+        return write(
+            self.screen,
+            "FPS: {:6.3}  sim: {}".format(
+                self.clock.get_fps(),
+                "fast-forward" if speed is None else "{:g}x".format(speed),
+            ),
+            50,
+            50,
+            (0, 0, 250),
+            20,
+        )
+
+    def spawn_smart_rockets(self, number, keep=None):
+        """launch number SmartRockets, green if the trained agent predicts a hit,
+        red otherwise. keep=1 (or 0) only launches predicted hits (or misses).
+        candidates are drawn and classified in bulk with one model call per round"""
+        launched = 0
+        while launched < number:
+            candidates = [
+                simulation.random_factors()
+                for _ in range(number if keep is None else 4 * number)
+            ]
+            predictions = self.trained_agent.classify(
+                [[round(f, 1) for f in factors] for factors in candidates]
+            )
+            for factors, prediction in zip(candidates, predictions):
+                if launched == number:
+                    break
+                if keep is not None and prediction != keep:
+                    continue
+                factor1, factor2, factor3, factor4 = factors
+                rocket = SmartRocket(
+                    pos=pygame.math.Vector2(100, 400),
+                    move=pygame.math.Vector2(50, 0),
+                    angle=0,
+                    kill_on_edge=True,
+                    max_distance=2 * Viewer.width,
+                    color=(0, 255, 0) if prediction == 1 else (255, 0, 0),
+                    factor1=factor1,
+                    factor2=factor2,
+                    factor3=factor3,
+                    factor4=factor4,
+                )
+                rocket.smokeToggle = False
+                launched += 1
+
+    def draw_swarm(self, swarm):
+        """draw living swarm rockets as black dots and write the hit count,
+        returns the rects drawn"""
+        rects = []
+        x, y = swarm.x[swarm.alive].astype(int), swarm.y[swarm.alive].astype(int)
+        for dot in zip(x.tolist(), y.tolist()):
+            self.screen.set_at(dot, (0, 0, 0))
+        if len(x):
+            rects.append(
+                pygame.Rect(
+                    x.min(), y.min(), x.max() - x.min() + 1, y.max() - y.min() + 1
+                )
+            )
+        text = write(
+            self.screen,
+            "swarm: {} flying, {} hits, {} misses".format(
+                swarm.alive.sum(), (swarm.winner == 1).sum(), (swarm.winner == 0).sum()
+            ),
+            50,
+            80,
+            (0, 0, 250),
+            20,
+        )
+        rects.append(text)
+        return rects
+
     def movingTargetRun(self):
         """The mainloop"""
         running = True
         for _ in self.allgroup:
             _.kill()
+        Viewer.smoke.clear()
         self.target1 = MovingTarget(
             pos=pygame.math.Vector2(800, 100), move=pygame.math.Vector2(0, 50)
         )
@@ -1262,10 +1382,13 @@ class Viewer:
         self.predicted_crosshair = PredCrosshair()
         pygame.mouse.set_visible(False)
         click_oldleft, click_oldmiddle, click_oldright = False, False, False
+        pygame.draw.line(self.background, (0, 0, 255), (800, 0), (800, Viewer.height))
+        self.renderer.invalidate()
+        self.timestep.reset()
         # points = []
         # --------------------------- main loop --------------------------
         while running:
-            milliseconds = self.clock.tick(self.fps)  #
+            milliseconds = self.clock.tick(self.timestep.tick_fps(self.fps))  #
             seconds = milliseconds / 1000
             self.playtime += seconds
             # -------- events ------
@@ -1297,6 +1420,13 @@ class Viewer:
                         self.crosshair.kill()
                         pygame.mouse.set_visible(True)
                         return
+                    if event.key == pygame.K_f:
+                        self.toggle_fast_forward()
+                    if event.key == pygame.K_m:
+                        if self.aimingModel is self.interceptModel:
+                            self.aimingModel = self.movingAgent
+                        else:
+                            self.aimingModel = self.interceptModel
                     if event.key == pygame.K_v:
                         target = self.predicted_crosshair.pos
 
@@ -1319,45 +1449,46 @@ class Viewer:
             pressed_keys = pygame.key.get_pressed()
             # ///
 
+            # --------- update all sprites in fixed steps ----------------
+            for _ in range(self.timestep.advance(seconds)):
+                self.moving_step(self.timestep.dt)
+            aiming = self.aimingModel
+            if aiming is self.movingAgent and aiming.model is None:
+                aiming = None  # no saved model before the first training is done
+            self.predicted_crosshair.update(
+                0,
+                aiming,
+                self.target1.pos,
+                1 if self.target1.move.y > 0 else 0,
+                pspeed=(0, 200),
+            )
+            if not self.timestep.render_due():
+                continue  # fast-forward: the simulation runs on, drawing waits
+
             # ---------- clear all --------------
             pygame.display.set_caption("Rocket Simulator | Moving-Target")
             pygame.display.set_icon(self.icon)
-            self.screen.blit(self.background, (0, 0))
+            self.renderer.begin()
+            mark = self.renderer.mark
 
             # ----- draw cannon ------
-            pygame.draw.circle(
-                self.screen, (0, 200, 0), (int(self.start.x), int(self.start.y)), 5
+            mark(
+                pygame.draw.circle(
+                    self.screen, (0, 200, 0), (int(self.start.x), int(self.start.y)), 5
+                )
             )
 
             # ----------- writing on screen ----------
-            write(
-                self.screen,
-                "FPS: {:6.3}".format(self.clock.get_fps()),
-                50,
-                50,
-                (0, 0, 250),
-                20,
-            )
-
-            pygame.draw.line(
-                self.background, (0, 0, 255), (800, 0), (800, Viewer.height)
-            )
-
-            # --------- update all sprites ----------------
-            self.allgroup.update(seconds)
-            self.predicted_crosshair.update(seconds, self.movingAgent, self.target1.pos, 1 if self.target1.move.y > 0 else 0, pspeed=(0,200))
-            # --------- collision detection ------------
-            for target in self.targetgroup:
-                crashgroup = pygame.sprite.spritecollide(
-                    target, self.beamgroup, False, pygame.sprite.collide_mask
-                )
-                for beam in crashgroup:
-                    Explosion(pos=pygame.math.Vector2(beam.pos.x, beam.pos.y))
-                    beam.kill(winner=True, writeData=False)
+            mark(self.write_fps())
+            status = self.predicted_crosshair.predictor.status()
+            if status is not None:
+                mark(write(self.screen, status, 50, 80, (250, 0, 0), 20))
 
             # ---------- blit all sprites --------------
-            self.allgroup.draw(self.screen)
-            pygame.display.flip()
+            timestep.interpolate(self.allgroup, self.timestep.alpha)
+            mark(Viewer.smoke.draw(self.screen))
+            mark(self.allgroup.draw(self.screen))
+            self.renderer.end()
 
         pygame.mouse.set_visible(True)
         pygame.quit()
@@ -1366,6 +1497,19 @@ class Viewer:
         # finally:
         #    pygame.quit()
 
+    def moving_step(self, seconds):
+        """one fixed simulation step of movingTargetRun"""
+        self.allgroup.update(seconds)
+        Viewer.smoke.update(seconds, Viewer.windvector)
+        # --------- collision detection ------------
+        hits = collision.collide_groups(self.targetgroup, self.beamgroup)
+        for target, crashgroup in hits.items():
+            for beam in crashgroup:
+                if not beam.alive():  # already hit another target
+                    continue
+                Explosion(pos=pygame.math.Vector2(beam.pos.x, beam.pos.y))
+                beam.kill(winner=True, writeData=False)
+
 
 ## -------------------- functions --------------------------------
 
@@ -1404,6 +1548,19 @@ def randomize_colors(color, by=30):
     return r, g, b
 
 
+@functools.lru_cache(maxsize=None)
+def get_font(font_name, font_size, bold):
+    """pygame.font.SysFont scans the system fonts, so each font is created once"""
+    return pygame.font.SysFont(font_name, font_size, bold)
+
+
+@functools.lru_cache(maxsize=256)
+def render_text(text, color, font_name, font_size, bold):
+    """rendered text surface, the least recently used ones are dropped.
+    the surface is shared: blit it, but do not draw on it"""
+    return get_font(font_name, font_size, bold).render(text, True, color)
+
+
 def write(
     background,
     text,
@@ -1419,31 +1576,31 @@ def write(
     the origin is the alignment of the text surface
     origin can be 'center', 'centercenter', 'topleft', 'topcenter', 'topright', 'centerleft', 'centerright',
     'bottomleft', 'bottomcenter', 'bottomright'
+    returns the rect of the text on background
     """
     if font_size is None:
         font_size = 24
-    font = pygame.font.SysFont(font_name, font_size, bold)
-    width, height = font.size(text)
-    surface = font.render(text, True, color)
+    surface = render_text(text, tuple(color), font_name, font_size, bold)
+    width, height = surface.get_size()
 
     if origin == "center" or origin == "centercenter":
-        background.blit(surface, (x - width // 2, y - height // 2))
+        return background.blit(surface, (x - width // 2, y - height // 2))
     elif origin == "topleft":
-        background.blit(surface, (x, y))
+        return background.blit(surface, (x, y))
     elif origin == "topcenter":
-        background.blit(surface, (x - width // 2, y))
+        return background.blit(surface, (x - width // 2, y))
     elif origin == "topright":
-        background.blit(surface, (x - width, y))
+        return background.blit(surface, (x - width, y))
     elif origin == "centerleft":
-        background.blit(surface, (x, y - height // 2))
+        return background.blit(surface, (x, y - height // 2))
     elif origin == "centerright":
-        background.blit(surface, (x - width, y - height // 2))
+        return background.blit(surface, (x - width, y - height // 2))
     elif origin == "bottomleft":
-        background.blit(surface, (x, y - height))
+        return background.blit(surface, (x, y - height))
     elif origin == "bottomcenter":
-        background.blit(surface, (x - width // 2, y))
+        return background.blit(surface, (x - width // 2, y))
     elif origin == "bottomright":
-        background.blit(surface, (x - width, y - height))
+        return background.blit(surface, (x - width, y - height))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,354 @@
+"""
+headless rocket simulation (no pygame display)
+
+replays the physics of rocketViewer.SmartRocket without any Surface, Sprite or
+window, so hit/miss labels for dataset.txt can be produced as fast as the cpu allows.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import math
+import random
+import numpy as np
+
+# ---- same values the Viewer uses in rocketViewer.py ----
+WIDTH = 1200
+HEIGHT = 800
+FPS = 60
+START_POS = (50, 400)  # SmartRocket._overwrite_parameters always resets pos to this
+START_MOVE = (50, 0)
+TARGET = (200, HEIGHT - 200, 800)  # (upper y, lower y, x of the target line)
+MAX_DISTANCE = 2 * WIDTH
+# ---- moving target run: cannon, SmarterRocket and MovingTarget ----
+CANNON = (100, 400)
+ROCKET_SPEED = 200
+TARGET_SPEED = 50
+TARGET_X = 800
+TARGET_SIZE = 50  # MovingTarget image is 50x50
+BEAM_SIZE = (25, 5)  # Beam.width, Beam.height
+
+
+def random_factors(rng=random):
+    """draw factor1..factor4 exactly like SmartRocket._overwrite_parameters does"""
+    factor1 = 0.1 + rng.random() * 5.5
+    factor2 = 5.0 + rng.random() * 60
+    factor3 = rng.choice((-1, 1))
+    factor4 = rng.choice((-1, 1))
+    return factor1, factor2, factor3, factor4
+
+
+def random_factors_array(number, rng=None):
+    """draw number factor tuples at once, returns a (number, 4) float array"""
+    if rng is None:
+        rng = np.random.default_rng()
+    factors = np.empty((number, 4))
+    factors[:, 0] = 0.1 + rng.random(number) * 5.5
+    factors[:, 1] = 5.0 + rng.random(number) * 60
+    factors[:, 2] = rng.choice((-1, 1), number)
+    factors[:, 3] = rng.choice((-1, 1), number)
+    return factors
+
+
+def dataset_row(factors, winner):
+    """one line of dataset.txt, formatted like SmartRocket.kill writes it"""
+    return ",".join([str(round(f, 1)) for f in factors] + [str(winner)]) + "\n"
+
+
+def moving_dataset_row(tspeed, rspeed, target_y, direction, hit_y):
+    """one line of movingdataset.txt, formatted like SmarterRocket.kill writes it"""
+    return "{},{},{},{},{}\n".format(
+        int(tspeed), rspeed, int(target_y), direction, int(hit_y)
+    )
+
+
+class HeadlessRocket:
+    """a SmartRocket without pygame: position, move vector and age only.
+
+    update() follows SmartRocket.update / update_old step by step:
+    age, max_distance, move, wallcheck (kill_on_edge), sinusoidal rotation
+    and finally the test against the target window.
+    """
+
+    def __init__(
+        self,
+        factor1,
+        factor2,
+        factor3,
+        factor4,
+        pos=START_POS,
+        move=START_MOVE,
+        target=TARGET,
+        area=(0, 0, WIDTH, HEIGHT),  # left, top, right, bottom
+        max_distance=MAX_DISTANCE,
+    ):
+        self.factor1 = factor1
+        self.factor2 = factor2
+        self.factor3 = factor3
+        self.factor4 = factor4
+        self.x, self.y = pos
+        self.dx, self.dy = move
+        self.target = target
+        self.area = area
+        self.max_distance = max_distance
+        self.age = 0
+        self.distance_traveled = 0
+        self.alive = True
+        self.winner = None  # 1 = hit, 0 = miss, None = still flying
+
+    def kill(self, winner=0):
+        # the sprite leaves all groups on its first kill, so only the first label counts
+        if self.alive:
+            self.alive = False
+            self.winner = winner
+
+    def update(self, seconds):
+        """advance the rocket by one frame of length seconds"""
+        self.age += seconds
+        if self.age < 0:
+            return
+        self.distance_traveled += math.hypot(self.dx, self.dy) * seconds
+        if self.max_distance is not None and self.distance_traveled > self.max_distance:
+            self.kill()
+        self.x += self.dx * seconds
+        self.y += self.dy * seconds
+        # ---- wallcheck with kill_on_edge ----
+        left, top, right, bottom = self.area
+        if self.x < left or self.y < top or self.x > right or self.y > bottom:
+            self.kill()
+        # ---- rotate move vector like pygame.math.Vector2.rotate_ip ----
+        delta_angle = (
+            math.sin(self.age * self.factor1 * self.factor3)
+            * self.factor2
+            * self.factor4
+        )
+        a = math.radians(delta_angle * seconds)
+        c, s = math.cos(a), math.sin(a)
+        self.dx, self.dy = self.dx * c - self.dy * s, self.dx * s + self.dy * c
+        # ---- target window ----
+        if self.x > self.target[2]:
+            if self.target[0] < self.y < self.target[1]:
+                self.kill(1)
+            elif self.y < self.target[0] or self.y > self.target[1]:
+                self.kill(0)
+
+
+def simulate_rocket(factors, seconds=1 / FPS, max_steps=100000, **kwargs):
+    """fly one rocket until it dies, return its label (1 = hit, 0 = miss)"""
+    rocket = HeadlessRocket(*factors, **kwargs)
+    for _ in range(max_steps):
+        rocket.update(seconds)
+        if not rocket.alive:
+            return rocket.winner
+    return 0
+
+
+def label_rockets(number, seconds=1 / FPS, rng=random):
+    """simulate number random rockets, return a list of (factors, winner)"""
+    result = []
+    for _ in range(number):
+        factors = random_factors(rng)
+        result.append((factors, simulate_rocket(factors, seconds)))
+    return result
+
+
+class RocketSwarm:
+    """many SmartRockets as a struct of numpy arrays.
+
+    step() advances every living rocket at once with the same rules as
+    HeadlessRocket.update: max_distance, kill_on_edge, rotation and target window.
+    dead rockets keep their last position and their label in self.winner
+    (1 = hit, 0 = miss, -1 = still flying).
+    """
+
+    def __init__(
+        self,
+        factors,
+        pos=START_POS,
+        move=START_MOVE,
+        target=TARGET,
+        area=(0, 0, WIDTH, HEIGHT),
+        max_distance=MAX_DISTANCE,
+    ):
+        self.factors = np.array(factors, dtype=np.float64).reshape(-1, 4)
+        number = len(self.factors)
+        self.x = np.full(number, float(pos[0]))
+        self.y = np.full(number, float(pos[1]))
+        self.dx = np.full(number, float(move[0]))
+        self.dy = np.full(number, float(move[1]))
+        self.age = np.zeros(number)
+        self.distance_traveled = np.zeros(number)
+        self.alive = np.ones(number, dtype=bool)
+        self.winner = np.full(number, -1, dtype=np.int8)
+        self.target = target
+        self.area = area
+        self.max_distance = max_distance
+        # constant per rocket, precomputed once
+        self.omega = self.factors[:, 0] * self.factors[:, 2]
+        self.amplitude = self.factors[:, 1] * self.factors[:, 3]
+
+    def __len__(self):
+        return len(self.factors)
+
+    def step(self, seconds):
+        """advance all living rockets by one frame, returns the number still alive"""
+        i = np.flatnonzero(self.alive)
+        if len(i) == 0:
+            return 0
+        age = self.age[i] + seconds
+        x, y, dx, dy = self.x[i], self.y[i], self.dx[i], self.dy[i]
+        distance = self.distance_traveled[i] + np.hypot(dx, dy) * seconds
+        x = x + dx * seconds
+        y = y + dy * seconds
+        left, top, right, bottom = self.area
+        # ---- kill on max_distance or screen edge: a miss ----
+        dead = (x < left) | (y < top) | (x > right) | (y > bottom)
+        if self.max_distance is not None:
+            dead |= distance > self.max_distance
+        # ---- rotate move vectors ----
+        a = np.radians(np.sin(age * self.omega[i]) * self.amplitude[i] * seconds)
+        c, s = np.cos(a), np.sin(a)
+        dx, dy = dx * c - dy * s, dx * s + dy * c
+        # ---- target window ----
+        upper, lower, line = self.target
+        behind = x > line
+        hit = behind & (y > upper) & (y < lower) & ~dead
+        dead |= behind & ((y < upper) | (y > lower))
+        # ---- write back ----
+        self.age[i] = age
+        self.distance_traveled[i] = distance
+        self.x[i], self.y[i], self.dx[i], self.dy[i] = x, y, dx, dy
+        self.winner[i[dead]] = 0
+        self.winner[i[hit]] = 1
+        self.alive[i[dead | hit]] = False
+        return len(i) - np.count_nonzero(dead | hit)
+
+    def run(self, seconds=1 / FPS, max_steps=100000):
+        """step until every rocket is dead, returns the labels (1 = hit, 0 = miss)"""
+        for _ in range(max_steps):
+            if self.step(seconds) == 0:
+                break
+        return np.where(self.winner == 1, 1, 0)
+
+
+def label_swarm(number, seconds=1 / FPS, rng=None):
+    """vectorized label_rockets: returns (factors, winners) as numpy arrays"""
+    factors = random_factors_array(number, rng)
+    return factors, RocketSwarm(factors).run(seconds)
+
+
+class ShotSwarm:
+    """many SmarterRocket shots at bouncing MovingTargets, as numpy arrays.
+
+    every shot n is a straight rocket from the cannon towards (TARGET_X, aim_y[n])
+    and its own target square at TARGET_X that starts at target_y[n] and moves
+    up (direction 0) or down (direction 1), bouncing on the screen edges like
+    MovingTarget. collide_mask is approximated by the bounding box of the
+    rotated beam against the target square.
+    """
+
+    def __init__(
+        self,
+        target_y,
+        direction,
+        aim_y,
+        tspeed=TARGET_SPEED,
+        rspeed=ROCKET_SPEED,
+        cannon=CANNON,
+        area=(0, 0, WIDTH, HEIGHT),
+    ):
+        self.target_y0 = np.asarray(target_y, dtype=np.float64)
+        self.direction = np.asarray(direction, dtype=np.int8)
+        self.aim_y = np.asarray(aim_y, dtype=np.float64)
+        self.tspeed = tspeed
+        self.rspeed = rspeed
+        self.area = area
+        number = len(self.aim_y)
+        self.ty = self.target_y0.copy()
+        self.tdy = np.where(self.direction == 1, tspeed, -tspeed).astype(np.float64)
+        self.x = np.full(number, float(cannon[0]))
+        self.y = np.full(number, float(cannon[1]))
+        aim_dx = TARGET_X - cannon[0]
+        aim_dy = self.aim_y - cannon[1]
+        length = np.hypot(aim_dx, aim_dy)
+        self.dx = aim_dx / length * rspeed
+        self.dy = aim_dy / length * rspeed
+        # half extents of the rotated beam's bounding box, constant per shot
+        cos, sin = np.abs(self.dx / rspeed), np.abs(self.dy / rspeed)
+        self.half_w = (BEAM_SIZE[0] * cos + BEAM_SIZE[1] * sin) / 2 + TARGET_SIZE / 2
+        self.half_h = (BEAM_SIZE[0] * sin + BEAM_SIZE[1] * cos) / 2 + TARGET_SIZE / 2
+        self.alive = np.ones(number, dtype=bool)
+        self.hit = np.zeros(number, dtype=bool)
+
+    def step(self, seconds):
+        """advance targets and living rockets by one frame, returns number alive"""
+        left, top, right, bottom = self.area
+        # ---- targets bounce on the upper and lower edge ----
+        self.ty += self.tdy * seconds
+        over = self.ty < top
+        self.ty[over] = top
+        self.tdy[over] *= -1
+        over = self.ty > bottom
+        self.ty[over] = bottom
+        self.tdy[over] *= -1
+        # ---- rockets fly straight ----
+        i = np.flatnonzero(self.alive)
+        if len(i) == 0:
+            return 0
+        x = self.x[i] + self.dx[i] * seconds
+        y = self.y[i] + self.dy[i] * seconds
+        self.x[i], self.y[i] = x, y
+        hit = (np.abs(x - TARGET_X) < self.half_w[i]) & (
+            np.abs(y - self.ty[i]) < self.half_h[i]
+        )
+        # past the target (or off screen) a rocket can not hit anymore
+        gone = (x > TARGET_X + self.half_w[i]) | (x < left) | (x > right)
+        gone |= (y < top) | (y > bottom)
+        self.hit[i[hit]] = True
+        self.alive[i[hit | gone]] = False
+        return len(i) - np.count_nonzero(hit | gone)
+
+    def run(self, seconds=1 / FPS, max_steps=100000):
+        """step until every shot hit or missed, returns the boolean hit array"""
+        for _ in range(max_steps):
+            if self.step(seconds) == 0:
+                break
+        return self.hit
+
+
+def label_shots(number, seconds=1 / FPS, rng=None, tspeed=TARGET_SPEED):
+    """fire number random shots, returns the hits as (number_of_hits, 5) array
+    with the movingdataset.txt columns: tspeed, rspeed, target y, direction, hit y"""
+    if rng is None:
+        rng = np.random.default_rng()
+    target_y = rng.random(number) * HEIGHT
+    direction = rng.integers(0, 2, number)
+    aim_y = rng.random(number) * HEIGHT
+    hit = ShotSwarm(target_y, direction, aim_y, tspeed=tspeed).run(seconds)
+    rows = np.empty((np.count_nonzero(hit), 5), dtype=np.int64)
+    rows[:, 0] = int(tspeed)
+    rows[:, 1] = ROCKET_SPEED
+    rows[:, 2] = target_y[hit].astype(np.int64)
+    rows[:, 3] = direction[hit]
+    rows[:, 4] = aim_y[hit].astype(np.int64)
+    return rows
+
+
+if __name__ == "__main__":
+    # example: label 1000 random rockets and print the hit rate
+    import time
+
+    start = time.perf_counter()
+    labels = label_rockets(1000)
+    duration = time.perf_counter() - start
+    hits = sum(winner for _, winner in labels)
+    print("{} rockets in {:.2f} s, {} hits".format(len(labels), duration, hits))
+
+    # the same with a vectorized swarm of 100000 rockets
+    start = time.perf_counter()
+    factors, winners = label_swarm(100000)
+    duration = time.perf_counter() - start
+    print(
+        "{} rockets in {:.2f} s, {} hits".format(len(winners), duration, winners.sum())
+    )
@@ -0,0 +1,217 @@
+"""
+streaming mini-batches for datasets larger than memory
+
+BatchStream reads a dataset (csv text or binary .rkd) in chunks, in a new random
+chunk order every epoch, shuffles the rows inside each chunk and cuts them into
+mini-batches. only one chunk (plus the prefetch queue) is in memory at a time.
+prefetch() runs a batch generator in a background thread, so reading and
+shuffling the next batches overlaps with training on the current one.
+read_new_rows() and sample_rows() serve incremental training: the rows appended
+after a cursor, and a small random replay sample of the rows before it.
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import itertools
+import queue
+import threading
+import numpy as np
+import binarydataset
+
+
+class BatchStream:
+    """shuffled (X, Y) mini-batches of a dataset file, chunk by chunk"""
+
+    def __init__(
+        self,
+        dataset,
+        xlength,
+        batch_size=1024,
+        chunk_rows=65536,
+        shuffle=True,
+        seed=None,
+    ):
+        self.dataset = dataset
+        self.xlength = xlength
+        self.batch_size = batch_size
+        self.chunk_rows = chunk_rows
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.binary = binarydataset.is_binary(dataset)
+        if self.binary:
+            self.rows = len(binarydataset.open_dataset(dataset))
+            self.chunks = [
+                (start, min(start + chunk_rows, self.rows))
+                for start in range(0, self.rows, chunk_rows)
+            ]
+        else:
+            self.chunks = self.index_csv()
+            self.rows = sum(rows for _, rows in self.chunks)
+
+    def index_csv(self):
+        """one pass over the text file: (byte offset, rows) of every chunk"""
+        chunks = []
+        with open(self.dataset, "rb") as f:
+            while True:
+                offset = f.tell()
+                rows = sum(
+                    1 for line in itertools.islice(f, self.chunk_rows) if line.strip()
+                )
+                if rows == 0:
+                    break
+                chunks.append((offset, rows))
+        return chunks
+
+    def read_chunk(self, chunk):
+        """X (float32) and Y of one chunk, read into memory"""
+        if self.binary:
+            start, end = chunk
+            data = np.array(binarydataset.open_dataset(self.dataset)[start:end])
+            return binarydataset.records_xy(data, self.xlength)
+        offset, rows = chunk
+        lines = []
+        with open(self.dataset, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    lines.append(line.decode("utf-8"))
+                    if len(lines) == rows:
+                        break
+        loaded = np.loadtxt(lines, delimiter=",", ndmin=2, dtype=np.float32)
+        return loaded[:, 0 : self.xlength], loaded[:, self.xlength]
+
+    def __len__(self):
+        """number of batches per epoch"""
+        return sum(
+            -(-self.chunk_size(chunk) // self.batch_size) for chunk in self.chunks
+        )
+
+    def chunk_size(self, chunk):
+        return chunk[1] - chunk[0] if self.binary else chunk[1]
+
+    def epoch(self):
+        """yield all batches of one epoch"""
+        order = np.arange(len(self.chunks))
+        if self.shuffle:
+            self.rng.shuffle(order)
+        for n in order:
+            X, Y = self.read_chunk(self.chunks[n])
+            if self.shuffle:
+                permutation = self.rng.permutation(len(X))
+                X, Y = X[permutation], Y[permutation]
+            for start in range(0, len(X), self.batch_size):
+                end = start + self.batch_size
+                yield X[start:end], Y[start:end]
+
+    def repeat(self, epochs=None):
+        """yield batches epoch after epoch (forever if epochs is None)"""
+        for _ in itertools.count() if epochs is None else range(epochs):
+            yield from self.epoch()
+
+
+def prefetch(batches, depth=8):
+    """run the batches generator in a background thread, up to depth batches ahead"""
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # wait for room, but give up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(done)
+        except Exception as error:  # hand errors over to the consumer
+            put(error)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = buffer.get()
+            if batch is done:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+
+
+# ---- incremental reading: a cursor marks how much of a dataset was already used ----
+
+
+def dataset_end(dataset):
+    """cursor at the end of dataset: {"rows": complete rows, "offset": byte offset}"""
+    if binarydataset.is_binary(dataset):
+        rows = len(binarydataset.open_dataset(dataset))
+        return {"rows": rows, "offset": None}
+    return read_new_rows(dataset, None, {"rows": 0, "offset": 0}, count_only=True)[2]
+
+
+def read_new_rows(dataset, xlength, cursor, count_only=False):
+    """X, Y of all complete rows after cursor, and the cursor behind them.
+    a last csv line without newline may still be written and is left for later"""
+    if binarydataset.is_binary(dataset):
+        data = binarydataset.open_dataset(dataset)
+        new = {"rows": len(data), "offset": None}
+        if count_only:
+            return None, None, new
+        data = np.array(data[cursor["rows"] :])
+        return binarydataset.records_xy(data, xlength) + (new,)
+    lines = []
+    rows = cursor["rows"]
+    with open(dataset, "rb") as f:
+        f.seek(cursor["offset"])
+        offset = cursor["offset"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                rows += 1
+                if not count_only:
+                    lines.append(line.decode("utf-8"))
+    new = {"rows": rows, "offset": offset}
+    if count_only:
+        return None, None, new
+    if not lines:
+        return np.empty((0, xlength), np.float32), np.empty(0, np.float32), new
+    loaded = np.loadtxt(lines, delimiter=",", ndmin=2, dtype=np.float32)
+    return loaded[:, 0:xlength], loaded[:, xlength], new
+
+
+def sample_rows(dataset, xlength, cursor, number, rng):
+    """X, Y of number random rows from before cursor (the replay sample), every
+    row equally likely. csv rows are numbered with BatchStream's chunk index,
+    only the chunks holding a picked row are read"""
+    if number <= 0 or cursor["rows"] == 0:
+        return np.empty((0, xlength), np.float32), np.empty(0, np.float32)
+    picks = np.sort(rng.integers(0, cursor["rows"], number))
+    if binarydataset.is_binary(dataset):
+        data = binarydataset.open_dataset(dataset)
+        return binarydataset.records_xy(np.array(data[picks]), xlength)
+    stream = BatchStream(dataset, xlength, shuffle=False)
+    first = np.cumsum([0] + [rows for _, rows in stream.chunks])  # row of each chunk
+    chunk_of = np.searchsorted(first, picks, side="right") - 1
+    Xs, Ys = [], []
+    for n in np.unique(chunk_of):
+        offset, rows = stream.chunks[n]
+        # rows behind the cursor are not parsed (the last one may be half written)
+        X, Y = stream.read_chunk((offset, min(rows, cursor["rows"] - first[n])))
+        rows = picks[chunk_of == n] - first[n]
+        Xs.append(X[rows])
+        Ys.append(Y[rows])
+    return np.concatenate(Xs), np.concatenate(Ys)
@@ -0,0 +1,125 @@
+"""
+SmartRocket trajectories from closed-form headings
+
+a SmartRocket flies at constant speed and turns by
+sin(age * factor1 * factor3) * factor2 * factor4 degrees per second. per frame
+of length dt the heading after m frames is therefore a sum of sines with a
+closed form:
+
+    sum(sin(j * b), j = 1..m) = sin(m * b / 2) * sin((m + 1) * b / 2) / sin(b / 2)
+    heading(m) = heading(0) + factor2 * factor4 * dt * sum(...),  b = factor1 * factor3 * dt
+
+so no heading depends on the one before it. the positions have no such
+closed form (they sum the cosine of a cosine), so evaluate() still visits every
+frame: it computes the headings of a block of frames for many rockets at once,
+takes the cumulative sum of their (cos, sin) and finds the frame where a rocket
+hits, leaves the screen or crosses the target line. that removes the Python
+loop per frame, but the work is O(frames) per rocket, like RocketSwarm, and
+about as fast. the result follows HeadlessRocket / RocketSwarm frame for frame
+(up to float rounding); a smaller dt approaches the continuous flight.
+
+TrajectoryModel wraps evaluate() in the predict() interface of the agents'
+models, as an exact stand-in for TrainedAgent's network:
+    agent.loadmodel(trajectory.TrajectoryModel())
+
+author: Simon Heppner
+email: simon@heppner.at
+website: simon.heppner.at
+"""
+
+import numpy as np
+from simulation import FPS, START_POS, START_MOVE, TARGET, WIDTH, HEIGHT, MAX_DISTANCE
+
+
+def heading(factors, frames, seconds=1 / FPS, move=START_MOVE):
+    """heading in radians after frames (array) rotations, for every factor tuple:
+    an array of shape (len(factors), len(frames))"""
+    factors = np.asarray(factors, dtype=np.float64).reshape(-1, 4)
+    m = np.asarray(frames, dtype=np.float64)[None, :]
+    b = (factors[:, 0] * factors[:, 2] * seconds)[:, None]
+    amplitude = (factors[:, 1] * factors[:, 3] * seconds)[:, None]
+    # factor1 or factor3 = 0 (b = 0): the rocket does not turn, the sum is 0
+    half = np.sin(b / 2)
+    straight = np.abs(half) < 1e-12
+    sines = np.where(
+        straight,
+        0.0,
+        np.sin(m * b / 2) * np.sin((m + 1) * b / 2) / np.where(straight, 1.0, half),
+    )
+    return np.arctan2(move[1], move[0]) + np.radians(amplitude * sines)
+
+
+def evaluate(
+    factors,
+    seconds=1 / FPS,
+    pos=START_POS,
+    move=START_MOVE,
+    target=TARGET,
+    area=(0, 0, WIDTH, HEIGHT),
+    max_distance=MAX_DISTANCE,
+    max_steps=100000,
+    block=512,
+):
+    """fly all rockets (one per factor tuple) without stepping them one by one.
+    returns winner (1 = hit, 0 = miss), the number of frames flown and the
+    final x, y of every rocket. a rocket that crossed target[2] ends at its
+    first position behind the line"""
+    factors = np.asarray(factors, dtype=np.float64).reshape(-1, 4)
+    number = len(factors)
+    speed = float(np.hypot(move[0], move[1]))
+    left, top, right, bottom = area
+    upper, lower, line = target
+    winner = np.zeros(number, dtype=np.int8)
+    steps = np.full(number, max_steps, dtype=np.int64)
+    x = np.full(number, float(pos[0]))
+    y = np.full(number, float(pos[1]))
+    i = np.arange(number)  # rockets still flying
+    start = 0  # frames flown so far
+    while len(i) and start < max_steps:
+        length = min(block, max_steps - start)
+        frames = np.arange(start, start + length)  # rotations before each move
+        theta = heading(factors[i], frames, seconds, move)
+        bx = x[i, None] + np.cumsum(np.cos(theta), axis=1) * (speed * seconds)
+        by = y[i, None] + np.cumsum(np.sin(theta), axis=1) * (speed * seconds)
+        # ---- the same kill rules as HeadlessRocket.update, for every frame ----
+        dead = (bx < left) | (by < top) | (bx > right) | (by > bottom)
+        if max_distance is not None:
+            dead |= ((frames + 1) * (speed * seconds) > max_distance)[None, :]
+        behind = bx > line
+        hit = behind & (by > upper) & (by < lower) & ~dead
+        dead |= behind & ((by < upper) | (by > lower))
+        over = hit | dead
+        ended = over.any(axis=1)
+        first = over.argmax(axis=1)
+        # ---- finished rockets: label and position of their last frame ----
+        done = i[ended]
+        column = first[ended]
+        rows = np.flatnonzero(ended)
+        winner[done] = hit[rows, column]
+        steps[done] = start + column + 1
+        x[done], y[done] = bx[rows, column], by[rows, column]
+        # ---- the others go on from the end of the block ----
+        x[i[~ended]], y[i[~ended]] = bx[~ended, -1], by[~ended, -1]
+        i = i[~ended]
+        start += length
+    return winner, steps, x, y
+
+
+class TrajectoryModel:
+    """exact hit/miss "model" with the predict() interface of NumpyModel:
+    rows of factor1..factor4 in, (n, 1) array of 1.0 (hit) / 0.0 (miss) out"""
+
+    def __init__(self, seconds=1 / FPS, **kwargs):
+        self.seconds = seconds
+        self.kwargs = kwargs  # pos, move, target, ... for evaluate()
+
+    def predict(self, X, **kwargs):
+        winner = evaluate(np.atleast_2d(X), self.seconds, **self.kwargs)[0]
+        return winner.astype(np.float32)[:, None]
+
+    def summary(self):
+        print(
+            "TrajectoryModel: SmartRocket flight, closed-form headings, dt={}".format(
+                self.seconds
+            )
+        )